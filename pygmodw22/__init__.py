@@ -0,0 +1,27 @@
+"""
+pygmodw22 : Pygame Modelling Workshop 2022
+
+The simulation core (kernels, swarm, shared_state, distributed, convergence) only depends on numpy. The pygame based
+visualization (sims, agent) and matplotlib are only loaded on first use, so that e.g. the workers of a parameter sweep
+can import the core without paying for the GUI libraries.
+"""
+import importlib
+
+_lazy_attributes = {
+    "Simulation": "pygmodw22.sims",
+    "Agent": "pygmodw22.agent",
+    "Swarm": "pygmodw22.swarm",
+    "DistributedSwarm": "pygmodw22.distributed",
+    "ConvergenceMonitor": "pygmodw22.convergence",
+    "AgentTypes": "pygmodw22.agent_types",
+}
+
+
+def __getattr__(name):
+    if name in _lazy_attributes:
+        return getattr(importlib.import_module(_lazy_attributes[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_lazy_attributes))
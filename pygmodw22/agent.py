@@ -7,6 +7,7 @@ from math import atan2
 import pygame
 import numpy as np
 from pygmodw22 import support
+from pygmodw22.agent_types import PAIR_PARAMS
 
 
 class Agent(pygame.sprite.Sprite):
@@ -49,6 +50,17 @@ class Agent(pygame.sprite.Sprite):
         self.steepness_alg = -0.5
         self.r_alg = 150
 
+        # Perception
+        # blind zone behind the agent in radians (0: omnidirectional perception)
+        self.blind_angle = 0
+        # number of nearest perceived neighbours the agent interacts with (None: all, i.e. metric interaction)
+        self.k_neighbours = None
+
+        # Agent type in heterogeneous populations. If agent_types (AgentTypes parameter table) is set, the interaction
+        # parameters are looked up for each pair of agent types instead of using the attributes above
+        self.type_id = 0
+        self.agent_types = None
+
         # Noise
         self.noise_sig = 0.1
 
@@ -57,6 +69,7 @@ class Agent(pygame.sprite.Sprite):
         # Boundary conditions
         # bounce_back: agents bouncing back from walls as particles
         # infinite: agents continue moving in both x and y direction and teleported to other side
+        # obstacles: walls are part of the obstacle map of the simulation (see obstacles.py)
         self.boundary = "infinite"
 
         self.id = id
@@ -134,10 +147,11 @@ class Agent(pygame.sprite.Sprite):
 
         heading_vec = np.array([v1_x, v1_y])
 
-        # CALCULATING attraction force with all agents:
+        # CALCULATING attraction force with all perceived agents:
         vec_attr_total = np.zeros(2)
         vec_rep_total = np.zeros(2)
         vec_alg_total = np.zeros(2)
+        perceived = []
         for ag in agents:
             if ag.id != self.id:
                 # Distance between focal agent and given pair
@@ -145,23 +159,45 @@ class Agent(pygame.sprite.Sprite):
                 ag_pos_y = ag.position[1] + ag.radius
                 s_pos_x = self.position[0] + self.radius
                 s_pos_y = self.position[1] + self.radius
-                if self.boundary == "bounce_back":
-                    distvec = np.array([ag_pos_x - s_pos_x, ag_pos_y - s_pos_y])
-                elif self.boundary == "infinite":
+                if self.boundary == "infinite":
                     distvec = support.distance_infinite(np.array([s_pos_x, s_pos_y]),
-                                                        np.array([ag_pos_x, ag_pos_y]))
-
-                # Difference between velocity between given agents
-                s_vel = np.array([self.velocity * np.cos(self.orientation), - self.velocity * np.sin(self.orientation)])
-                ag_vel = np.array([ag.velocity * np.cos(ag.orientation), - ag.velocity * np.sin(ag.orientation)])
-                dvel = ag_vel - s_vel
+                                                        np.array([ag_pos_x, ag_pos_y]),
+                                                        L=(self.WIDTH, self.HEIGHT))
+                else:
+                    # bounce_back or walls handled by an obstacle map
+                    distvec = np.array([ag_pos_x - s_pos_x, ag_pos_y - s_pos_y])
+                dist = np.linalg.norm(distvec)
+
+                # Skipping agents in the blind zone behind the focal agent
+                if self.blind_angle > 0 and dist > 0:
+                    cos_bearing = np.dot(heading_vec, distvec) / (self.radius * dist)
+                    if cos_bearing < -np.cos(self.blind_angle / 2):
+                        continue
+                perceived.append((dist, ag, distvec))
+
+        # Topological interaction with the k nearest perceived agents
+        if self.k_neighbours is not None:
+            perceived = sorted(perceived, key=lambda neighbour: neighbour[0])[:self.k_neighbours]
+
+        own_params = {param: getattr(self, param) for param in PAIR_PARAMS}
+        for dist, ag, distvec in perceived:
+            # Difference between velocity between given agents
+            s_vel = np.array([self.velocity * np.cos(self.orientation), - self.velocity * np.sin(self.orientation)])
+            ag_vel = np.array([ag.velocity * np.cos(ag.orientation), - ag.velocity * np.sin(ag.orientation)])
+            dvel = ag_vel - s_vel
+
+            # Interaction parameters of the pair
+            if self.agent_types is not None:
+                p = self.agent_types.pair(self.type_id, ag.type_id)
+            else:
+                p = own_params
 
-                # Calculating interaction forces
-                vec_attr_total += support.CalcSingleAttForce(self.r_att, self.steepness_att, distvec)
-                vec_rep_total += support.CalcSingleRepForce(self.r_rep, self.steepness_rep, distvec)
-                vec_alg_total += support.CalcSingleAlgForce(self.r_alg, self.steepness_alg, distvec, dvel)
+            # Calculating interaction forces
+            vec_attr_total += p["s_att"] * support.CalcSingleAttForce(p["r_att"], p["steepness_att"], distvec)
+            vec_rep_total += p["s_rep"] * support.CalcSingleRepForce(p["r_rep"], p["steepness_rep"], distvec)
+            vec_alg_total += p["s_alg"] * support.CalcSingleAlgForce(p["r_alg"], p["steepness_alg"], distvec, dvel)
 
-        force_total = self.s_att * vec_attr_total - self.s_rep * vec_rep_total + self.s_alg * vec_alg_total
+        force_total = vec_attr_total - vec_rep_total + vec_alg_total
 
         vel = self.v_max * np.linalg.norm(force_total)
         closed_angle = support.angle_between(heading_vec, force_total)
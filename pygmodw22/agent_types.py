@@ -0,0 +1,114 @@
+"""
+agent_types.py : heterogeneous agent populations (e.g. leaders and followers, predators and prey) defined by a
+            parameter table instead of subclassing agents. Every agent has a type index, parameters of the focal agent
+            (noise, velocity, perception) are looked up by its type, interaction parameters by the pair
+            (type of focal agent, type of partner). The tables are plain arrays so that the vectorized kernels can
+            index them for all pairs at once.
+
+Usage:
+    agent_types = AgentTypes(
+        types={"follower": {}, "leader": {"s_att": 0, "noise_sig": 0.05}},
+        interactions={("follower", "leader"): {"s_att": 0.1, "r_att": 400}},
+    )
+    swarm = Swarm(N=50, agent_types=agent_types, types={"leader": 5, "follower": 45})
+"""
+import numpy as np
+
+from pygmodw22.kernels import AGENT_PARAMS
+
+# Parameters of pairs of agents, stored as (n_types, n_types) matrices
+PAIR_PARAMS = ("s_att", "s_rep", "s_alg", "steepness_att", "r_att", "steepness_rep", "r_rep", "steepness_alg", "r_alg")
+# Parameters of the focal agent, stored per type
+FOCAL_PARAMS = ("noise_sig", "dt", "v_max", "blind_angle", "k_neighbours")
+
+
+class AgentTypes:
+    """
+    Parameter table of agent types
+    """
+
+    def __init__(self, types, interactions=None, defaults=None):
+        """
+        Creating the parameter table
+
+        :param types: dictionary of type name -> dictionary of parameters overriding the defaults for agents of this
+            type. The order of the dictionary defines the type indices.
+        :param interactions: optional dictionary of (focal type name, partner type name) -> dictionary of interaction
+            parameters (see PAIR_PARAMS) that are used when an agent of the focal type reacts to an agent of the
+            partner type. Pairs not listed here use the parameters of the focal type.
+        :param defaults: optional dictionary of parameters shared by all types, overriding kernels.AGENT_PARAMS
+        """
+        self.names = list(types)
+        if len(self.names) == 0:
+            raise ValueError("At least one agent type has to be defined")
+        self.index = {name: i for i, name in enumerate(self.names)}
+        defaults = dict(AGENT_PARAMS, **(defaults or {}))
+        unknown = set(defaults) - set(AGENT_PARAMS)
+        if unknown:
+            raise ValueError(f"Unknown default parameters {sorted(unknown)}")
+        self.params = []
+        for name in self.names:
+            unknown = set(types[name]) - set(AGENT_PARAMS)
+            if unknown:
+                raise ValueError(f"Unknown parameters {sorted(unknown)} of agent type '{name}'")
+            self.params.append(dict(defaults, **types[name]))
+
+        n_types = len(self.names)
+        self.pair_params = {param: np.array([[self.params[i][param]] * n_types for i in range(n_types)],
+                                            dtype=np.float64) for param in PAIR_PARAMS}
+        for (focal, partner), overrides in (interactions or {}).items():
+            unknown = set(overrides) - set(PAIR_PARAMS)
+            if unknown:
+                raise ValueError(f"Unknown interaction parameters {sorted(unknown)} of pair ({focal}, {partner})")
+            for param, value in overrides.items():
+                self.pair_params[param][self.index[focal], self.index[partner]] = value
+
+    def __len__(self):
+        return len(self.names)
+
+    def type_ids(self, types, N):
+        """
+        Type indices of N agents
+
+        :param types: None (all agents have the first type), a sequence of N type names or indices, or a dictionary of
+            type name -> number of agents (assigned in the order of the dictionary)
+        :param N: number of agents
+        :return: type indices as (N, ) integer array
+        """
+        if types is None:
+            return np.zeros(N, dtype=np.int64)
+        if isinstance(types, dict):
+            if sum(types.values()) != N:
+                raise ValueError(f"Number of agents of all types ({sum(types.values())}) is not N={N}")
+            return np.concatenate([np.full(count, self.index[name], dtype=np.int64)
+                                   for name, count in types.items()] + [np.zeros(0, dtype=np.int64)])
+        if len(types) != N:
+            raise ValueError(f"Number of agent types ({len(types)}) is not N={N}")
+        return np.array([self.index[t] if isinstance(t, str) else int(t) for t in types], dtype=np.int64)
+
+    def focal_params(self, type_ids):
+        """Parameters of the focal agents as (N, ) arrays according to their types"""
+        type_ids = np.asarray(type_ids, dtype=np.int64)
+        params = {}
+        for param in FOCAL_PARAMS:
+            values = [self.params[i][param] for i in range(len(self))]
+            if param == "k_neighbours":
+                if all(value is None for value in values):
+                    params[param] = None
+                    continue
+                # no limit on the number of neighbours
+                values = [len(type_ids) if value is None else value for value in values]
+            params[param] = np.asarray(values)[type_ids]
+        return params
+
+    def pair(self, type_i, type_j):
+        """Interaction parameters of a single pair of types as a dictionary (used by Agent.update_forces)"""
+        return {param: self.pair_params[param][type_i, type_j] for param in PAIR_PARAMS}
+
+    def kernel_params(self, type_ids):
+        """Keyword arguments of kernels.social_forces, kernels.integrate and kernels.directional_noise for agents
+        with the given types"""
+        params = self.focal_params(type_ids)
+        params.update(self.pair_params)
+        params["types"] = np.asarray(type_ids, dtype=np.int64)
+        return params
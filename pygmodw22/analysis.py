@@ -0,0 +1,253 @@
+"""
+analysis.py : out-of-core analysis of recorded trajectories. Trajectories are read from disk block by block (chunks of
+            timesteps), blocks are processed in parallel worker processes and the partial histograms/sums are merged
+            into the final result, so that the memory usage is bounded by the block size and not by the length of the
+            recording. Pair statistics only consider pairs within the analysed range (cell search) and process them in
+            blocks limited by a memory budget, so that they also scale to large swarms.
+
+A trajectory on disk is either a zarr group or a directory of .npy files with the following arrays:
+    positions:    (T, N, 2) agent positions (same convention as Agent.position)
+    orientations: (T, N)    agent orientations
+    velocities:   (T, N)    agent absolute velocities
+
+Usage:
+    r, g = pair_correlation("run_001.zarr", r_max=250, box=(500, 500))
+    lags, vacf = velocity_autocorrelation("run_001.zarr", max_lag=200)
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from pygmodw22 import kernels
+
+ARRAY_NAMES = ("positions", "orientations", "velocities")
+# approximate size of the temporary arrays of a single pair of agents in bytes (distance vector and its periodic copy,
+# distance, masks)
+PAIR_BYTES = 64
+
+
+class TrajectoryStore:
+    """
+    Lazy access to a trajectory on disk. Only the path is pickled when the store is sent to worker processes, each
+    process opens the arrays itself.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path of a zarr group or of a directory with positions.npy, orientations.npy and velocities.npy
+        """
+        self.path = str(path)
+        self._arrays = None
+
+    def __getstate__(self):
+        return {"path": self.path, "_arrays": None}
+
+    @property
+    def arrays(self):
+        """Opening the arrays (memory mapped .npy files or zarr arrays) on first access"""
+        if self._arrays is None:
+            if os.path.exists(os.path.join(self.path, "positions.npy")):
+                self._arrays = {name: np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+                                for name in ARRAY_NAMES}
+            else:
+                # zarr is only needed when zarr stores are analysed
+                import zarr
+                group = zarr.open_group(self.path, mode="r")
+                self._arrays = {name: group[name] for name in ARRAY_NAMES}
+        return self._arrays
+
+    @property
+    def n_frames(self):
+        return self.arrays["positions"].shape[0]
+
+    @property
+    def n_agents(self):
+        return self.arrays["positions"].shape[1]
+
+    @property
+    def chunk_frames(self):
+        """Number of timesteps in a chunk of the stored array (default 100 for .npy files)"""
+        chunks = getattr(self.arrays["positions"], "chunks", None)
+        return chunks[0] if chunks else 100
+
+    def read(self, name, start, stop):
+        """Reading the frames between start and stop of a single array into memory"""
+        return np.asarray(self.arrays[name][start:stop])
+
+
+def save_trajectory(path, positions, orientations, velocities):
+    """Saving a trajectory held in memory as .npy files that can be analysed by this module
+
+    :param path: directory to save into (created if it does not exist)
+    :param positions: (T, N, 2) agent positions
+    :param orientations: (T, N) agent orientations
+    :param velocities: (T, N) agent absolute velocities
+    """
+    os.makedirs(path, exist_ok=True)
+    for name, array in zip(ARRAY_NAMES, (positions, orientations, velocities)):
+        np.save(os.path.join(path, f"{name}.npy"), np.asarray(array, dtype=np.float64))
+
+
+def _pairwise_distances(positions, box, boundary, r_max, memory_budget):
+    """Yielding pairs of agents closer than r_max in a single frame as (rows, partners, dist, close) blocks. Candidate
+    partners are searched in cells of size r_max (as in kernels.social_forces) and rows are processed in blocks whose
+    temporary arrays fit into memory_budget bytes. close marks every unordered pair (partner index > row index) closer
+    than r_max exactly once."""
+    periodic = boundary == "infinite"
+    for idx, partners in kernels._cell_blocks(positions, positions, r_max, box, periodic, len(positions)):
+        # distance vectors, distances and masks of a single pair take about PAIR_BYTES bytes
+        n_rows = max(1, int(memory_budget // (PAIR_BYTES * max(len(partners), 1))))
+        o_positions = positions[partners]
+        for start in range(0, len(idx), n_rows):
+            rows = idx[start:start + n_rows]
+            distvec = o_positions[None, :, :] - positions[rows][:, None, :]
+            if periodic:
+                distvec = kernels.minimum_image(distvec, box)
+            dist = np.sqrt(distvec[..., 0] ** 2 + distvec[..., 1] ** 2)
+            close = (dist <= r_max) & (partners[None, :] > rows[:, None])
+            yield rows, partners, dist, close
+
+
+def _pair_histogram(store, start, stop, bins, box, boundary, memory_budget):
+    """Partial pair distance histogram of frames between start and stop"""
+    counts = np.zeros(len(bins) - 1, dtype=np.int64)
+    positions = store.read("positions", start, stop)
+    for frame in positions:
+        for _, _, dist, close in _pairwise_distances(frame, box, boundary, bins[-1], memory_budget):
+            counts += np.histogram(dist[close], bins=bins)[0]
+    return {"counts": counts, "frames": len(positions)}
+
+
+def _neighbour_histogram(store, start, stop, radius, box, boundary, memory_budget):
+    """Partial histogram of the number of neighbours within radius for frames between start and stop"""
+    positions = store.read("positions", start, stop)
+    N = positions.shape[1]
+    counts = np.zeros(N, dtype=np.int64)
+    for frame in positions:
+        n_neighbours = np.zeros(N, dtype=np.int64)
+        for rows, partners, _, close in _pairwise_distances(frame, box, boundary, radius, memory_budget):
+            n_neighbours[rows] += close.sum(axis=1)
+            np.add.at(n_neighbours, partners, close.sum(axis=0))
+        counts += np.bincount(n_neighbours, minlength=N)
+    return {"counts": counts, "frames": len(positions)}
+
+
+def _velocity_correlation(store, start, stop, max_lag):
+    """Partial sums of v_i(t) * v_i(t + lag) for time origins t between start and stop"""
+    end = min(stop + max_lag, store.n_frames)
+    orientations = store.read("orientations", start, end)
+    velocities = store.read("velocities", start, end)
+    vx = velocities * np.cos(orientations)
+    vy = -velocities * np.sin(orientations)
+    n_origins = stop - start
+    sums = np.zeros(max_lag + 1)
+    counts = np.zeros(max_lag + 1, dtype=np.int64)
+    for lag in range(max_lag + 1):
+        n = min(n_origins, len(vx) - lag)
+        if n <= 0:
+            break
+        sums[lag] = np.sum(vx[:n] * vx[lag:lag + n] + vy[:n] * vy[lag:lag + n])
+        counts[lag] = n * vx.shape[1]
+    return {"sums": sums, "counts": counts}
+
+
+def _run_blocks(func, store, frames, chunk_frames, n_workers, **kwargs):
+    """Running func on consecutive blocks of frames (in parallel if n_workers > 1) and summing up the partial
+    results returned as dictionaries of arrays/numbers."""
+    start, stop = frames if frames is not None else (0, store.n_frames)
+    chunk_frames = chunk_frames if chunk_frames is not None else store.chunk_frames
+    blocks = [(s, min(s + chunk_frames, stop)) for s in range(start, stop, chunk_frames)]
+    total = None
+
+    def merge(partial):
+        nonlocal total
+        if total is None:
+            total = partial
+        else:
+            for key, value in partial.items():
+                total[key] = total[key] + value
+
+    if n_workers == 1:
+        for block_start, block_stop in blocks:
+            merge(func(store, block_start, block_stop, **kwargs))
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(func, store, block_start, block_stop, **kwargs)
+                       for block_start, block_stop in blocks]
+            for future in as_completed(futures):
+                merge(future.result())
+    return total
+
+
+def pair_correlation(path, r_max=250, n_bins=50, box=(500, 500), boundary="infinite", frames=None,
+                     chunk_frames=None, n_workers=None, memory_budget=2 ** 26):
+    """
+    Pair correlation function g(r) averaged over time
+
+    :param path: path of the recorded trajectory (see TrajectoryStore)
+    :param r_max: maximal pair distance in pixels
+    :param n_bins: number of distance bins
+    :param box: real arena size as (width, height) used for periodic distances and for normalization
+    :param boundary: boundary condition of the recorded run, bounce_back or infinite
+    :param frames: optional (start, stop) range of timesteps to analyse
+    :param chunk_frames: number of timesteps processed in a single task. Default is the chunk size of the store.
+    :param n_workers: number of worker processes. Default is the number of CPU cores.
+    :param memory_budget: maximal size of temporary pair arrays of a single task in bytes (in addition to the frames
+        of the task). Pairs are searched in cells of size r_max, so the work per frame grows with the number of close
+        pairs and not with N^2.
+    :return r, g: bin centers and pair correlation values
+    """
+    store = TrajectoryStore(path)
+    bins = np.linspace(0, r_max, n_bins + 1)
+    result = _run_blocks(_pair_histogram, store, frames, chunk_frames, n_workers, bins=bins, box=box,
+                         boundary=boundary, memory_budget=memory_budget)
+    N = store.n_agents
+    # every agent has N - 1 possible partners
+    density = (N - 1) / (box[0] * box[1])
+    shell_area = np.pi * (bins[1:] ** 2 - bins[:-1] ** 2)
+    # expected number of unordered pairs (N (N - 1) / 2 in total) in each shell for uniformly distributed agents
+    expected = result["frames"] * 0.5 * N * density * shell_area
+    r = 0.5 * (bins[1:] + bins[:-1])
+    return r, result["counts"] / expected
+
+
+def neighbour_statistics(path, radius=50, box=(500, 500), boundary="infinite", frames=None, chunk_frames=None,
+                         n_workers=None, memory_budget=2 ** 26):
+    """
+    Distribution of the number of neighbours within a given radius
+
+    :param path: path of the recorded trajectory (see TrajectoryStore)
+    :param radius: neighbourhood radius in pixels
+    :param memory_budget: maximal size of temporary pair arrays of a single task in bytes, see pair_correlation
+    :return: dictionary with the probability of each neighbour number (index) and the mean number of neighbours
+    """
+    store = TrajectoryStore(path)
+    result = _run_blocks(_neighbour_histogram, store, frames, chunk_frames, n_workers, radius=radius, box=box,
+                         boundary=boundary, memory_budget=memory_budget)
+    distribution = result["counts"] / result["counts"].sum()
+    return {"distribution": distribution, "mean": np.sum(np.arange(len(distribution)) * distribution)}
+
+
+def velocity_autocorrelation(path, max_lag=100, normalize=True, frames=None, chunk_frames=None, n_workers=None):
+    """
+    Velocity autocorrelation function <v_i(t) * v_i(t + lag)> averaged over agents and time origins
+
+    :param path: path of the recorded trajectory (see TrajectoryStore)
+    :param max_lag: maximal time lag in timesteps
+    :param normalize: if True the result is divided by its value at lag 0
+    :return lags, vacf: time lags and autocorrelation values
+    """
+    store = TrajectoryStore(path)
+    start, stop = frames if frames is not None else (0, store.n_frames)
+    if stop - start <= max_lag:
+        raise ValueError(f"Analysed frames ({stop - start}) have to be more than max_lag={max_lag}")
+    # time origins are only taken where the full lag range is available within the analysed frames, so no frame after
+    # stop is read
+    n_origins = stop - start - max_lag
+    result = _run_blocks(_velocity_correlation, store, (start, start + n_origins), chunk_frames, n_workers,
+                         max_lag=max_lag)
+    vacf = result["sums"] / np.maximum(result["counts"], 1)
+    if normalize and vacf[0] != 0:
+        vacf = vacf / vacf[0]
+    return np.arange(max_lag + 1), vacf
@@ -0,0 +1,89 @@
+"""
+convergence.py : detecting steady states of the collective (e.g. a stable flock or mill) so that batch runs can be
+            terminated early instead of always running until the dedicated simulation time.
+"""
+from collections import deque
+
+import numpy as np
+
+from pygmodw22 import support
+
+# Order parameters that can be monitored, calculated from (positions, orientations, velocities, box, boundary)
+ORDER_PARAMETERS = {
+    "polarization": lambda positions, orientations, velocities, box, boundary: support.polarization(orientations),
+    "milling": lambda positions, orientations, velocities, box, boundary: support.milling(
+        positions, orientations, box=box if boundary == "infinite" else None),
+    "mean_velocity": lambda positions, orientations, velocities, box, boundary: np.mean(velocities),
+}
+
+
+class ConvergenceMonitor:
+    """
+    Tracking order parameters over two consecutive sliding windows. The run is considered stationary when the mean of
+    every monitored order parameter differs less than the tolerance between the two windows.
+    """
+
+    def __init__(self, window=100, tolerance=0.01, min_steps=200, max_steps=None,
+                 order_parameters=("polarization", "milling")):
+        """
+        Initializing the convergence monitor
+
+        :param window: length of a single sliding window in timesteps
+        :param tolerance: maximal difference of window means for an order parameter to be considered stationary
+        :param min_steps: the run is never stopped before this timestep
+        :param max_steps: the run is always stopped at this timestep, even if not converged. None means no limit
+            (the simulation time T of the simulation still applies).
+        :param order_parameters: names of monitored order parameters (see ORDER_PARAMETERS)
+        """
+        self.window = window
+        self.tolerance = tolerance
+        self.min_steps = min_steps
+        self.max_steps = max_steps
+        for name in order_parameters:
+            if name not in ORDER_PARAMETERS:
+                raise ValueError(f"Unknown order parameter '{name}', use one of {list(ORDER_PARAMETERS)}")
+        self.order_parameters = order_parameters
+        self.reset()
+
+    def reset(self):
+        """Forgetting all recorded values, e.g. before reusing the monitor for a new run"""
+        self.history = {name: [] for name in self.order_parameters}
+        self.windows = {name: deque(maxlen=2 * self.window) for name in self.order_parameters}
+        self.converged = False
+        self.t_converged = None
+        self.should_stop = False
+
+    def update(self, t, positions, orientations, velocities, box=(500, 500), boundary="infinite"):
+        """
+        Recording the order parameters of the current state and checking for stationarity
+
+        :param t: current timestep
+        :param positions: positions of all agents as (N, 2) array
+        :param orientations: orientations of all agents as (N, ) array
+        :param velocities: absolute velocities of all agents as (N, ) array
+        :param box: real arena size as (width, height)
+        :param boundary: boundary condition of the run, with infinite (periodic) boundaries the order parameters are
+            calculated with minimum image distances
+        :return should_stop: True if the run should be terminated
+        """
+        for name in self.order_parameters:
+            value = ORDER_PARAMETERS[name](positions, orientations, velocities, box, boundary)
+            self.history[name].append(value)
+            self.windows[name].append(value)
+
+        if not self.converged and t >= self.min_steps and self.is_stationary():
+            self.converged = True
+            self.t_converged = t
+
+        self.should_stop = self.converged or (self.max_steps is not None and t >= self.max_steps)
+        return self.should_stop
+
+    def is_stationary(self):
+        """Checking if the means of the two last windows are the same within tolerance for all order parameters"""
+        for values in self.windows.values():
+            if len(values) < 2 * self.window:
+                return False
+            values = np.asarray(values)
+            if np.abs(np.mean(values[:self.window]) - np.mean(values[self.window:])) > self.tolerance:
+                return False
+        return True
@@ -0,0 +1,210 @@
+"""
+distributed.py : running a single large swarm on multiple cores with spatial domain decomposition. The arena is split
+            into vertical strips, one per worker process. The state of all agents lives in a shared memory block
+            (see shared_state.py), each worker owns the agents whose center is in its strip and reads the agents of
+            neighbouring strips that are within the interaction cutoff (halo) directly from shared memory. Agents
+            crossing strip borders are handed over to the neighbouring worker (migration) at the end of every step.
+
+Usage:
+    with DistributedSwarm(N=100000, width=20000, height=20000, n_workers=8) as swarm:
+        swarm.run(1000)
+        positions, orientations, velocities = swarm.get_state()
+"""
+import multiprocessing as mp
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from pygmodw22 import kernels
+from pygmodw22.shared_state import SharedStateWriter, _map_arrays, SEQ, STEP
+
+
+def strip_index(centers_x, n_strips, width, window_pad):
+    """Index of the strip (worker) that owns agents with the given center x coordinates"""
+    strip_width = width / n_strips
+    idx = np.floor((centers_x - window_pad) / strip_width).astype(np.int64)
+    return np.clip(idx, 0, n_strips - 1)
+
+
+def _worker(rank, config, state_name, owner_name, barrier, conn):
+    """Main loop of a worker process owning a single strip of the arena"""
+    # workers share the resource tracker of the main process that owns (and unlinks) the blocks
+    state_shm = shared_memory.SharedMemory(name=state_name)
+    owner_shm = shared_memory.SharedMemory(name=owner_name)
+    try:
+        N = config["N"]
+        header, positions, orientations, velocities = _map_arrays(state_shm.buf, N)
+        owner = np.ndarray((N,), dtype=np.int64, buffer=owner_shm.buf)
+
+        params = config["params"]
+        n_workers = config["n_workers"]
+        radius = config["agent_radius"]
+        pad = config["window_pad"]
+        width, height = config["width"], config["height"]
+        boundary = config["boundary"]
+        cutoff = config["cutoff"]
+        boundaries_x = [pad, pad + width]
+        boundaries_y = [pad, pad + height]
+        strip_width = width / n_workers
+        strip_mid = pad + (rank + 0.5) * strip_width
+        rng = np.random.RandomState(config["seed"] + rank if config["seed"] is not None else None)
+
+        while True:
+            command, steps = conn.recv()
+            if command == "stop":
+                break
+
+            for _ in range(steps):
+                own = np.flatnonzero(owner == rank)
+
+                # halo exchange: own agents and agents of other strips within cutoff distance of this strip
+                dx = positions[:, 0] + radius - strip_mid
+                if boundary == "infinite":
+                    dx -= width * np.round(dx / width)
+                partners = np.flatnonzero(np.abs(dx) <= strip_width / 2 + cutoff)
+
+                dtheta, dv = kernels.social_forces(
+                    positions[own] + radius, orientations[own], velocities[own], ids=own,
+                    others=(positions[partners] + radius, orientations[partners], velocities[partners], partners),
+                    boundary=boundary, box=(width, height), cutoff=cutoff, **params)
+                dtheta += kernels.directional_noise(len(own), rng=rng, **params)
+                new_pos, new_ori, new_vel = kernels.integrate(
+                    positions[own], orientations[own], velocities[own], dtheta, dv, radius,
+                    boundaries_x, boundaries_y, boundary, **params)
+
+                # nobody writes before everybody finished reading the previous state
+                if rank == 0:
+                    header[SEQ] += 1
+                barrier.wait()
+                positions[own] = new_pos
+                orientations[own] = new_ori
+                velocities[own] = new_vel
+                # migration of agents that left the strip
+                owner[own] = strip_index(new_pos[:, 0] + radius, n_workers, width, pad)
+                barrier.wait()
+                if rank == 0:
+                    header[STEP] += 1
+                    header[SEQ] += 1
+
+            conn.send(("done", None))
+
+    except Exception:
+        barrier.abort()
+        conn.send(("error", traceback.format_exc()))
+    finally:
+        header = positions = orientations = velocities = owner = None
+        state_shm.close()
+        owner_shm.close()
+
+
+class DistributedSwarm:
+    """
+    Headless simulation of a single swarm distributed over multiple worker processes by spatial domain decomposition.
+    The model is the same as in agent.py (through the vectorized kernels), interaction partners further away than the
+    interaction cutoff are neglected.
+    """
+
+    def __init__(self, N=1000, width=500, height=500, n_workers=None, boundary="infinite", agent_radius=10,
+                 window_pad=30, seed=None, shared_state_name=None, agent_params=None):
+        """
+        Initializing the distributed simulation and starting the worker processes
+
+        :param N: number of agents
+        :param width: real width of environment
+        :param height: real height of environment
+        :param n_workers: number of worker processes (strips). Default is the number of CPU cores.
+        :param boundary: boundary condition, bounce_back or infinite
+        :param agent_radius: radius of the agents
+        :param window_pad: padding of the environment in pixels (for the same coordinates as Simulation)
+        :param seed: random seed of initial conditions and noise. Workers use seed + worker index.
+        :param shared_state_name: name of the shared memory block holding the state (see shared_state.py)
+        :param agent_params: dictionary to override default agent parameters (see kernels.AGENT_PARAMS)
+        """
+        self.N = N
+        self.WIDTH = width
+        self.HEIGHT = height
+        self.window_pad = window_pad
+        self.agent_radii = agent_radius
+        self.boundary = boundary
+        self.n_workers = n_workers if n_workers is not None else mp.cpu_count()
+        self.t = 0
+
+        self.params = dict(kernels.AGENT_PARAMS)
+        if agent_params is not None:
+            self.params.update(agent_params)
+        self.cutoff = kernels.interaction_cutoff(**self.params)
+
+        # Initial conditions the same way as Simulation.create_agents
+        rng = np.random.RandomState(seed)
+        self.state = SharedStateWriter(N, name=shared_state_name)
+        self.state.positions[:, 0] = rng.randint(window_pad - agent_radius, width + window_pad - agent_radius, N)
+        self.state.positions[:, 1] = rng.randint(window_pad - agent_radius, height + window_pad - agent_radius, N)
+        self.state.orientations[:] = rng.uniform(0, 2 * np.pi, N)
+        self.state.velocities[:] = 1
+
+        self.owner_shm = shared_memory.SharedMemory(create=True, size=max(N, 1) * np.dtype(np.int64).itemsize)
+        self.owner = np.ndarray((N,), dtype=np.int64, buffer=self.owner_shm.buf)
+        self.owner[:] = strip_index(self.state.positions[:, 0] + agent_radius, self.n_workers, width, window_pad)
+
+        config = {
+            "N": N, "n_workers": self.n_workers, "agent_radius": agent_radius, "window_pad": window_pad,
+            "width": width, "height": height, "boundary": boundary, "cutoff": self.cutoff, "params": self.params,
+            "seed": seed,
+        }
+        ctx = mp.get_context()
+        barrier = ctx.Barrier(self.n_workers)
+        self.connections = []
+        self.workers = []
+        for rank in range(self.n_workers):
+            parent_conn, child_conn = ctx.Pipe()
+            worker = ctx.Process(target=_worker, args=(rank, config, self.state.name, self.owner_shm.name, barrier,
+                                                       child_conn), daemon=True)
+            worker.start()
+            self.connections.append(parent_conn)
+            self.workers.append(worker)
+
+    def run(self, T):
+        """Running the simulation for T timesteps"""
+        for conn in self.connections:
+            conn.send(("run", T))
+        errors = []
+        for conn in self.connections:
+            status, message = conn.recv()
+            if status == "error":
+                errors.append(message)
+        if errors:
+            raise RuntimeError("Worker process failed:\n" + "\n".join(errors))
+        self.t += T
+
+    def get_state(self):
+        """Copying the state of all agents
+        :return: positions as (N, 2), orientations as (N, ) and velocities as (N, ) arrays"""
+        return self.state.positions.copy(), self.state.orientations.copy(), self.state.velocities.copy()
+
+    def set_state(self, positions, orientations, velocities):
+        """Overwriting the state of all agents between runs (e.g. to start from given initial conditions)
+        :param positions: positions as (N, 2) array
+        :param orientations: orientations as (N, ) array
+        :param velocities: absolute velocities as (N, ) array"""
+        self.state.publish(positions, orientations, velocities, self.t)
+        self.owner[:] = strip_index(self.state.positions[:, 0] + self.agent_radii, self.n_workers, self.WIDTH,
+                                    self.window_pad)
+
+    def close(self):
+        """Stopping worker processes and releasing shared memory"""
+        for conn, worker in zip(self.connections, self.workers):
+            if worker.is_alive():
+                conn.send(("stop", None))
+            worker.join()
+        self.connections, self.workers = [], []
+        self.owner = None
+        self.owner_shm.close()
+        self.owner_shm.unlink()
+        self.state.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
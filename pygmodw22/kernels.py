@@ -0,0 +1,336 @@
+"""
+kernels.py : vectorized (numpy) versions of the agent model. The functions here calculate the same social forces and
+            state updates as Agent.update_forces and Agent.update but for all agents at once, operating on plain arrays
+            instead of sprites.
+
+Conventions are the same as in agent.py: positions are the upper left corners of the agents' bounding boxes (centers
+are position + radius), orientation 0 is facing to the right and y is growing downwards.
+"""
+import numpy as np
+
+from pygmodw22 import support
+
+# Default parameters of the agents, the same as hard-coded in Agent.__init__
+AGENT_PARAMS = {
+    "s_att": 0.02,
+    "s_rep": 5,
+    "s_alg": 8,
+    "steepness_att": -0.5,
+    "r_att": 250,
+    "steepness_rep": -0.5,
+    "r_rep": 50,
+    "steepness_alg": -0.5,
+    "r_alg": 150,
+    "noise_sig": 0.1,
+    "dt": 0.05,
+    "v_max": 1,
+    "blind_angle": 0,
+    "k_neighbours": None,
+}
+
+
+def interaction_cutoff(r_att=250, steepness_att=-0.5, r_rep=50, steepness_rep=-0.5, r_alg=150, steepness_alg=-0.5,
+                       eps=1e-12, **kwargs):
+    """Distance above which all sigmoid interaction kernels are smaller than eps. Pairs further away than this do not
+    change the forces within floating point precision, so they can be skipped.
+
+    :return cutoff: cutoff distance in pixels
+    """
+    cutoff = 0
+    for r, steepness in ((r_att, steepness_att), (r_rep, steepness_rep), (r_alg, steepness_alg)):
+        # 0.5 * (tanh(s * (d - r)) + 1) ~ exp(2 * s * (d - r)) for s * (d - r) << 0
+        # parameters can also be given per pair of agent types as matrices
+        cutoff = max(cutoff, float(np.max(r + np.log(eps) / (2 * np.asarray(steepness, dtype=np.float64)))))
+    return cutoff
+
+
+def minimum_image(distvec, box):
+    """Periodic (minimum image) version of distance vectors with the last axis as (x, y). Vectorized generalization of
+    support.distance_infinite for arbitrary arena sizes.
+
+    :param distvec: array of distance vectors with shape (..., 2)
+    :param box: arena size as (width, height)
+    """
+    return support.distance_infinite(0, distvec, L=box)
+
+
+def _window(sorted_x, lo, hi, period=None):
+    """Indices (into sorted_x) of values between lo and hi. If period is given the window is wrapped around."""
+    if period is None:
+        return np.arange(np.searchsorted(sorted_x, lo, "left"), np.searchsorted(sorted_x, hi, "right"))
+    if hi - lo >= period:
+        return np.arange(len(sorted_x))
+    segments = [(max(lo, 0), min(hi, period))]
+    if lo < 0:
+        segments.append((lo + period, period))
+    if hi > period:
+        segments.append((0, hi - period))
+    return np.concatenate([np.arange(np.searchsorted(sorted_x, a, "left"), np.searchsorted(sorted_x, b, "right"))
+                           for a, b in segments])
+
+
+def _cell_blocks(centers, o_centers, cutoff, box, periodic, chunk_size):
+    """Grouping focal agents into blocks of cells (rows of height >= cutoff, columns of width 2 * cutoff) and
+    yielding each block together with the indices of the partners that can be closer than cutoff to the block."""
+    if periodic:
+        x, y = centers[:, 0] % box[0], centers[:, 1] % box[1]
+        o_x, o_y = o_centers[:, 0] % box[0], o_centers[:, 1] % box[1]
+        origin_y = 0
+        n_rows = max(1, int(box[1] // cutoff))
+        row_height = box[1] / n_rows
+    else:
+        x, y = centers[:, 0], centers[:, 1]
+        o_x, o_y = o_centers[:, 0], o_centers[:, 1]
+        origin_y = min(y.min(), o_y.min())
+        row_height = cutoff
+        n_rows = int((max(y.max(), o_y.max()) - origin_y) // row_height) + 1
+    rows = np.minimum(((y - origin_y) // row_height).astype(np.int64), n_rows - 1)
+    o_rows = np.minimum(((o_y - origin_y) // row_height).astype(np.int64), n_rows - 1)
+    cols = ((x - x.min()) // (2 * cutoff)).astype(np.int64)
+
+    # focal agents and partners sorted by row, then by x
+    order = np.lexsort((x, rows))
+    o_order = np.lexsort((o_x, o_rows))
+    o_x_sorted = o_x[o_order]
+    row_ptr = np.searchsorted(o_rows[o_order], np.arange(n_rows + 1))
+
+    keys = rows[order] * (cols.max() + 1) + cols[order]
+    for block in np.split(order, np.flatnonzero(np.diff(keys)) + 1):
+        for start in range(0, len(block), chunk_size):
+            idx = block[start:start + chunk_size]
+            row = rows[idx[0]]
+            lo, hi = x[idx].min() - cutoff, x[idx].max() + cutoff
+            if periodic:
+                neighbour_rows = sorted({(row - 1) % n_rows, row, (row + 1) % n_rows})
+            else:
+                neighbour_rows = [r for r in (row - 1, row, row + 1) if 0 <= r < n_rows]
+            partners = [row_ptr[r] + _window(o_x_sorted[row_ptr[r]:row_ptr[r + 1]], lo, hi,
+                                             box[0] if periodic else None) for r in neighbour_rows]
+            yield idx, o_order[np.concatenate(partners)]
+
+
+def nearest_neighbour_mask(dist, mask, k_neighbours):
+    """Restricting interactions to the k nearest (allowed) partners of each focal agent using partial sorts.
+
+    :param dist: pairwise distances as (n, m) array
+    :param mask: allowed pairs as (n, m) boolean array
+    :param k_neighbours: number of nearest neighbours, a single number or one per focal agent as (n, ) array
+    :return: new mask with only the k nearest allowed partners
+    """
+    k = np.broadcast_to(np.asarray(k_neighbours, dtype=np.int64), (len(dist),))
+    kmax = int(min(k.max(initial=0), dist.shape[1]))
+    if kmax == 0:
+        return np.zeros_like(mask)
+    masked_dist = np.where(mask, dist, np.inf)
+    if kmax < dist.shape[1]:
+        nearest = np.argpartition(masked_dist, kmax - 1, axis=1)[:, :kmax]
+    else:
+        nearest = np.broadcast_to(np.arange(kmax), (len(dist), kmax))
+    nearest_dist = np.take_along_axis(masked_dist, nearest, axis=1)
+    keep = np.isfinite(nearest_dist)
+    if np.any(k < kmax):
+        # ranks within the kmax nearest (small sort) for agents with fewer neighbours
+        rank = np.empty_like(nearest)
+        np.put_along_axis(rank, np.argsort(nearest_dist, axis=1, kind="stable"), np.arange(kmax)[None, :], axis=1)
+        keep &= rank < k[:, None]
+    new_mask = np.zeros_like(mask)
+    np.put_along_axis(new_mask, nearest, keep, axis=1)
+    return new_mask
+
+
+def social_forces(centers, orientations, velocities, ids=None, others=None, boundary="infinite", box=(500, 500),
+                  cutoff=None, chunk_size=512, s_att=0.02, s_rep=5, s_alg=8, steepness_att=-0.5, r_att=250,
+                  steepness_rep=-0.5, r_rep=50, steepness_alg=-0.5, r_alg=150, v_max=1, blind_angle=0,
+                  k_neighbours=None, types=None, **kwargs):
+    """
+    Calculating the change in orientation and velocity of focal agents according to the attraction, repulsion and
+    alignment forces of their interaction partners. Same as Agent.update_forces without the directional noise.
+
+    :param centers: center coordinates of focal agents as (n, 2) array
+    :param orientations: orientations of focal agents as (n, ) array
+    :param velocities: absolute velocities of focal agents as (n, ) array
+    :param ids: unique ids of focal agents as (n, ) array, used to exclude self-interaction. Default is range(n).
+    :param others: interaction partners as (centers, orientations, velocities, ids) tuple, or (centers, orientations,
+        velocities, ids, types) for heterogeneous populations. Default is the focal agents.
+    :param boundary: boundary condition, bounce_back or infinite (periodic)
+    :param box: arena size as (width, height), used for the periodic distances in infinite boundary condition
+    :param cutoff: if not None, only pairs closer than this distance interact (see interaction_cutoff)
+    :param chunk_size: number of focal agents processed together (bounds memory to chunk_size x partners)
+    :param blind_angle: angle (in radians) of the blind zone behind the agents, a single number or one per focal
+        agent. Partners with a bearing larger than pi - blind_angle / 2 are not perceived.
+    :param k_neighbours: if not None, focal agents only interact with their k nearest perceived partners (topological
+        interaction), a single number or one per focal agent
+    :param types: type indices of focal agents as (n, ) array for heterogeneous populations. In this case the
+        interaction strengths, steepnesses and ranges can be (n_types, n_types) matrices indexed by (type of focal agent,
+        type of partner), see agent_types.AgentTypes. v_max can be given per focal agent.
+    :return dtheta, dv: change in orientation and velocity as (n, ) arrays
+    """
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+    orientations = np.asarray(orientations, dtype=np.float64)
+    velocities = np.asarray(velocities, dtype=np.float64)
+    n = len(centers)
+    if ids is None:
+        ids = np.arange(n)
+    if others is None:
+        others = (centers, orientations, velocities, ids, types)
+    o_centers, o_orientations, o_velocities, o_ids = others[:4]
+    o_types = others[4] if len(others) > 4 else None
+    if types is not None:
+        if o_types is None:
+            raise ValueError("Types of interaction partners are missing, others has to include types as 5th entry")
+        types = np.asarray(types, dtype=np.int64)
+        o_types = np.asarray(o_types, dtype=np.int64)
+        n_types = int(max(types.max(initial=0), o_types.max(initial=0))) + 1
+    # pair parameters that are the same for all pairs of types are used as single numbers (no lookup needed)
+    s_att, s_rep, s_alg, steepness_att, r_att, steepness_rep, r_rep, steepness_alg, r_alg = [
+        np.asarray(param).flat[0] if np.ndim(param) == 2 and np.all(param == np.asarray(param).flat[0]) else param
+        for param in (s_att, s_rep, s_alg, steepness_att, r_att, steepness_rep, r_rep, steepness_alg, r_alg)]
+    o_centers = np.asarray(o_centers, dtype=np.float64).reshape(-1, 2)
+    o_vel = np.stack([o_velocities * np.cos(o_orientations), -o_velocities * np.sin(o_orientations)], axis=-1)
+    s_vel = np.stack([velocities * np.cos(orientations), -velocities * np.sin(orientations)], axis=-1)
+    periodic = boundary == "infinite"
+    # limits of perception per focal agent
+    min_cos_bearing = np.broadcast_to(-np.cos(np.asarray(blind_angle, dtype=np.float64) / 2), (n,))
+    limited_fov = np.any(np.asarray(blind_angle) > 0)
+    if k_neighbours is not None:
+        k_neighbours = np.broadcast_to(np.asarray(k_neighbours), (n,))
+
+    # with a cutoff only neighbouring cells are checked, otherwise all partners in chunks of focal agents
+    if n == 0 or len(o_centers) == 0:
+        blocks = []
+    elif cutoff is not None:
+        blocks = _cell_blocks(centers, o_centers, cutoff, box, periodic, chunk_size)
+    else:
+        blocks = ((np.arange(start, min(start + chunk_size, n)), slice(None)) for start in range(0, n, chunk_size))
+
+    force_total = np.zeros((n, 2))
+    for idx, partners in blocks:
+        # pairwise distance vectors (chunk, partners, 2)
+        distvec = o_centers[partners][None, :, :] - centers[idx][:, None, :]
+        if periodic:
+            distvec = minimum_image(distvec, box)
+        dist = np.sqrt(distvec[..., 0] ** 2 + distvec[..., 1] ** 2)
+        mask = ids[idx][:, None] != np.asarray(o_ids)[partners][None, :]
+        if cutoff is not None:
+            mask &= dist <= cutoff
+        if limited_fov:
+            # vision cone: cosine of the bearing of partners relative to the heading of the focal agent
+            cos_bearing = (distvec[..., 0] * np.cos(orientations[idx])[:, None] -
+                           distvec[..., 1] * np.sin(orientations[idx])[:, None]) / np.where(dist > 0, dist, 1)
+            mask &= cos_bearing >= min_cos_bearing[idx, None]
+        if k_neighbours is not None:
+            mask = nearest_neighbour_mask(dist, mask, k_neighbours[idx])
+
+        # parameters of pairs, looked up by (type_i, type_j) if given as matrices
+        if types is not None:
+            pair = types[idx][:, None] * n_types + o_types[partners][None, :]
+
+        def pair_value(param):
+            return np.asarray(param).ravel()[pair] if np.ndim(param) == 2 else param
+
+        F_att = np.where(mask, pair_value(s_att) * 0.5 * (
+            np.tanh(pair_value(steepness_att) * (dist - pair_value(r_att))) + 1), 0)
+        F_rep = np.where(mask, pair_value(s_rep) * 0.5 * (
+            np.tanh(pair_value(steepness_rep) * (dist - pair_value(r_rep))) + 1), 0)
+        F_alg = np.where(mask, pair_value(s_alg) * 0.5 * (
+            np.tanh(pair_value(steepness_alg) * (dist - pair_value(r_alg))) + 1), 0)
+        vec_attr_total = np.einsum("ij,ijk->ik", F_att, distvec)
+        vec_rep_total = np.einsum("ij,ijk->ik", F_rep, distvec)
+        # sum_j F_alg_ij * (v_j - v_i)
+        vec_alg_total = F_alg @ o_vel[partners] - F_alg.sum(axis=1)[:, None] * s_vel[idx]
+        force_total[idx] = vec_attr_total - vec_rep_total + vec_alg_total
+
+    dv = v_max * np.linalg.norm(force_total, axis=1)
+
+    # signed angle between heading and total force as in support.angle_between
+    force_norm = np.linalg.norm(force_total, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fx = force_total[:, 0] / force_norm
+        fy = force_total[:, 1] / force_norm
+    hx = np.cos(orientations)
+    hy = -np.sin(orientations)
+    closed_angle = np.arccos(np.clip(hx * fx + hy * fy, -1.0, 1.0))
+    closed_angle = np.where(hx * fy - hy * fx < 0, -closed_angle, closed_angle)
+    closed_angle = closed_angle % (2 * np.pi)
+    # converting to our orientation convention (theta=0 is pointing to the right, see Agent.update_forces)
+    dtheta = np.where((0 < closed_angle) & (closed_angle < np.pi), -closed_angle, 2 * np.pi - closed_angle)
+    dtheta = np.where(np.isnan(closed_angle), 0, dtheta)
+    return dtheta, dv
+
+
+def directional_noise(n, noise_sig=0.1, rng=np.random, **kwargs):
+    """Pooling directional noise for n agents the same way as Agent.update_forces. noise_sig can be given per agent,
+    agents without noise do not draw random numbers (as in Agent.update_forces)."""
+    if np.ndim(noise_sig) == 0:
+        if noise_sig > 0.0:
+            return rng.normal(0.0, noise_sig, size=n)
+        return np.zeros(n)
+    noise_sig = np.asarray(noise_sig, dtype=np.float64)
+    noise = np.zeros(n)
+    noisy = noise_sig > 0.0
+    if np.any(noisy):
+        noise[noisy] = rng.normal(0.0, noise_sig[noisy])
+    return noise
+
+
+def prove_orientation(orientations):
+    """Restricting orientation angles between 0 and 2 pi (vectorized Agent.prove_orientation)"""
+    orientations = np.where(orientations < 0, 2 * np.pi + orientations, orientations)
+    return np.where(orientations > np.pi * 2, orientations - 2 * np.pi, orientations)
+
+
+def reflect_from_walls(positions, orientations, radius, boundaries_x, boundaries_y, boundary="infinite"):
+    """Vectorized Agent.reflect_from_walls. Returns new positions and orientations."""
+    positions = positions.copy()
+    x = positions[:, 0] + radius
+    y = positions[:, 1] + radius
+    if boundary == "bounce_back":
+        ori = orientations
+        # left wall
+        hit = x < boundaries_x[0]
+        positions[hit, 0] = boundaries_x[0] - radius
+        ori = np.where(hit & (np.pi / 2 <= ori) & (ori < np.pi), ori - np.pi / 2,
+                       np.where(hit & (np.pi <= ori) & (ori <= 3 * np.pi / 2), ori + np.pi / 2, ori))
+        ori = np.where(hit, prove_orientation(ori), ori)
+        # right wall
+        hit = x > boundaries_x[1]
+        positions[hit, 0] = boundaries_x[1] - radius - 1
+        ori = np.where(hit & (3 * np.pi / 2 <= ori) & (ori < 2 * np.pi), ori - np.pi / 2,
+                       np.where(hit & (0 <= ori) & (ori <= np.pi / 2), ori + np.pi / 2, ori))
+        ori = np.where(hit, prove_orientation(ori), ori)
+        # upper wall
+        hit = y < boundaries_y[0]
+        positions[hit, 1] = boundaries_y[0] - radius
+        ori = np.where(hit & (np.pi / 2 <= ori) & (ori <= np.pi), ori + np.pi / 2,
+                       np.where(hit & (0 <= ori) & (ori < np.pi / 2), ori - np.pi / 2, ori))
+        ori = np.where(hit, prove_orientation(ori), ori)
+        # lower wall
+        hit = y > boundaries_y[1]
+        positions[hit, 1] = boundaries_y[1] - radius - 1
+        ori = np.where(hit & (3 * np.pi / 2 <= ori) & (ori <= 2 * np.pi), ori + np.pi / 2,
+                       np.where(hit & (np.pi <= ori) & (ori < 3 * np.pi / 2), ori - np.pi / 2, ori))
+        ori = np.where(hit, prove_orientation(ori), ori)
+        return positions, ori
+
+    elif boundary == "infinite":
+        positions[x < boundaries_x[0], 0] = boundaries_x[1] - radius
+        positions[x > boundaries_x[1], 0] = boundaries_x[0] + radius
+        positions[y < boundaries_y[0], 1] = boundaries_y[1] - radius
+        positions[y > boundaries_y[1], 1] = boundaries_y[0] + radius
+    return positions, orientations
+
+
+def integrate(positions, orientations, velocities, dtheta, dv, radius, boundaries_x, boundaries_y,
+              boundary="infinite", dt=0.05, v_max=1, **kwargs):
+    """
+    Updating the state of agents according to the calculated change in orientation and velocity (vectorized
+    Agent.update without visualization).
+
+    :return: new positions, orientations and velocities
+    """
+    orientations = prove_orientation(orientations + dt * dtheta)
+    velocities = velocities + dt * dv
+    velocities = np.where(np.abs(velocities) > v_max, v_max, velocities)
+    positions = positions + np.stack([velocities * np.cos(orientations), -velocities * np.sin(orientations)], axis=-1)
+    positions, orientations = reflect_from_walls(positions, orientations, radius, boundaries_x, boundaries_y, boundary)
+    return positions, orientations, velocities
@@ -0,0 +1,209 @@
+"""
+obstacles.py : static obstacles (pillars, corridors, arbitrary polygons or images) in the arena. The obstacle geometry
+            is rasterized once into a grid and converted into a signed distance field (distance to the closest
+            obstacle surface, negative inside obstacles) and its gradient. In every timestep the avoidance of all
+            agents is then a single vectorized lookup in these precomputed arrays, independently of the complexity
+            of the obstacle map.
+
+All coordinates are window coordinates (including the padding) as in Simulation, i.e. the arena is between
+window_pad and window_pad + width (height).
+"""
+import numpy as np
+
+
+class ObstacleMap:
+    """
+    Static obstacle map with precomputed signed distance field. Obstacles are added with the add_* methods, the
+    distance field is (re)computed lazily when it is first needed.
+    """
+
+    def __init__(self, width=500, height=500, window_pad=30, resolution=1.0, with_walls=True,
+                 mode="reflect", avoidance_range=30, avoidance_strength=0.1):
+        """
+        Initializing an empty obstacle map
+
+        :param width: real width of environment (not window size)
+        :param height: real height of environment (not window size)
+        :param window_pad: padding of the environment in simulation window in pixels
+        :param resolution: size of a grid cell of the distance field in pixels
+        :param with_walls: if True the area outside of the arena is an obstacle, so the walls of the arena are handled
+            (and drawn) the same way as other obstacles. Use a boundary condition of the agents other than
+            bounce_back and infinite in this case (e.g. "obstacles") to switch off Agent.reflect_from_walls.
+        :param mode: reflect: agents touching an obstacle are reflected from its surface as particles,
+            repulsion: agents additionally turn away from obstacles closer than avoidance_range
+        :param avoidance_range: distance from obstacle surfaces (in pixels) where repulsion starts
+        :param avoidance_strength: maximal turning towards the surface normal in a single timestep (repulsion mode)
+        """
+        self.WIDTH = width
+        self.HEIGHT = height
+        self.window_pad = window_pad
+        self.resolution = resolution
+        self.with_walls = with_walls
+        self.mode = mode
+        self.avoidance_range = avoidance_range
+        self.avoidance_strength = avoidance_strength
+
+        # grid covering the whole window, cell (i, j) is centered at ((j + 0.5) * res, (i + 0.5) * res)
+        self.shape = (int(np.ceil((height + 2 * window_pad) / resolution)),
+                      int(np.ceil((width + 2 * window_pad) / resolution)))
+        self.occupied = np.zeros(self.shape, dtype=bool)
+        if with_walls:
+            x, y = self._cell_centers()
+            self.occupied |= (x < window_pad) | (x > window_pad + width) | (y < window_pad) | (y > window_pad + height)
+        self.sdf = None
+        self.gradient = None
+        self._surface = None
+
+    def _cell_centers(self):
+        """Window coordinates of all grid cell centers as 2D arrays"""
+        x = (np.arange(self.shape[1]) + 0.5) * self.resolution
+        y = (np.arange(self.shape[0]) + 0.5) * self.resolution
+        return np.meshgrid(x, y)
+
+    def add_circle(self, cx, cy, r):
+        """Adding a circular obstacle (e.g. a pillar) centered at (cx, cy) with radius r"""
+        x, y = self._cell_centers()
+        self.occupied |= (x - cx) ** 2 + (y - cy) ** 2 <= r ** 2
+        self.sdf = None
+
+    def add_rectangle(self, x0, y0, w, h):
+        """Adding an axis aligned rectangular obstacle with upper left corner (x0, y0) and size (w, h)"""
+        x, y = self._cell_centers()
+        self.occupied |= (x >= x0) & (x <= x0 + w) & (y >= y0) & (y <= y0 + h)
+        self.sdf = None
+
+    def add_polygon(self, points):
+        """Adding a polygon shaped obstacle given by its corner points [(x1, y1), (x2, y2), ...]"""
+        x, y = self._cell_centers()
+        points = np.asarray(points, dtype=np.float64)
+        inside = np.zeros(self.shape, dtype=bool)
+        # even-odd rule: counting crossings of a horizontal ray with every edge
+        for (x1, y1), (x2, y2) in zip(points, np.roll(points, -1, axis=0)):
+            if y1 == y2:
+                continue
+            crosses = (y1 > y) != (y2 > y)
+            x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+            inside ^= crosses & (x < x_cross)
+        self.occupied |= inside
+        self.sdf = None
+
+    def add_image(self, path, threshold=128):
+        """Adding obstacles from an image. Dark pixels (below threshold) are obstacles. The image is stretched onto
+        the arena (without padding)."""
+        # opencv is only needed when obstacles are loaded from images
+        import cv2
+        image = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise FileNotFoundError(f"Could not read obstacle image {path}")
+        pad = int(round(self.window_pad / self.resolution))
+        size = (int(round(self.WIDTH / self.resolution)), int(round(self.HEIGHT / self.resolution)))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_NEAREST)
+        h = min(size[1], self.shape[0] - pad)
+        w = min(size[0], self.shape[1] - pad)
+        self.occupied[pad:pad + h, pad:pad + w] |= image[:h, :w] < threshold
+        self.sdf = None
+
+    def compute(self):
+        """Precomputing the signed distance field (in pixels, positive in free space) and its gradient"""
+        # scipy is only needed when an obstacle map is used
+        from scipy.ndimage import distance_transform_edt
+        if self.occupied.all():
+            raise ValueError("Obstacle map has no free space")
+        self._surface = None
+        if not self.occupied.any():
+            self.sdf = np.full(self.shape, np.inf)
+            self.gradient = np.zeros((2,) + self.shape)
+            return self.sdf
+        outside = distance_transform_edt(~self.occupied)
+        inside = distance_transform_edt(self.occupied)
+        # distances are measured between cell centers, the surface is half a cell away from the boundary cells
+        self.sdf = (outside - inside - 0.5 * np.sign(outside - inside)) * self.resolution
+        grad_y, grad_x = np.gradient(self.sdf, self.resolution)
+        self.gradient = np.stack([grad_x, grad_y])
+        return self.sdf
+
+    def sample(self, points):
+        """Signed distance and gradient of the field at given points (bilinear interpolation)
+
+        :param points: window coordinates as (N, 2) array
+        :return distance, normal: (N, ) signed distances and (N, 2) unit normals pointing away from obstacles
+        """
+        if self.sdf is None:
+            self.compute()
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        # fractional grid coordinates relative to cell centers
+        gx = np.clip(points[:, 0] / self.resolution - 0.5, 0, self.shape[1] - 1)
+        gy = np.clip(points[:, 1] / self.resolution - 0.5, 0, self.shape[0] - 1)
+        j0 = np.clip(gx.astype(np.int64), 0, max(self.shape[1] - 2, 0))
+        i0 = np.clip(gy.astype(np.int64), 0, max(self.shape[0] - 2, 0))
+        fx = gx - j0
+        fy = gy - i0
+        i1 = np.minimum(i0 + 1, self.shape[0] - 1)
+        j1 = np.minimum(j0 + 1, self.shape[1] - 1)
+
+        def interpolate(field):
+            return ((1 - fy) * ((1 - fx) * field[i0, j0] + fx * field[i0, j1]) +
+                    fy * ((1 - fx) * field[i1, j0] + fx * field[i1, j1]))
+
+        distance = interpolate(self.sdf)
+        normal = np.stack([interpolate(self.gradient[0]), interpolate(self.gradient[1])], axis=-1)
+        norm = np.linalg.norm(normal, axis=1)
+        norm[norm == 0] = 1
+        return distance, normal / norm[:, None]
+
+    def apply(self, positions, orientations, radius):
+        """
+        Obstacle avoidance of all agents with a single lookup in the distance field. Agents overlapping with an
+        obstacle are pushed out along the surface normal and their heading is reflected from the surface (if they are
+        moving towards it). In repulsion mode agents closer than avoidance_range also turn away from the obstacle.
+
+        :param positions: agent positions (upper left corners as in Agent.position) as (N, 2) array
+        :param orientations: agent orientations as (N, ) array
+        :param radius: radius of the agents
+        :return: new positions and orientations, agents not affected by obstacles keep their inputs unchanged
+        """
+        positions = np.asarray(positions, dtype=np.float64)
+        orientations = np.asarray(orientations, dtype=np.float64)
+        centers = positions + radius
+        distance, normal = self.sample(centers)
+        heading = np.stack([np.cos(orientations), -np.sin(orientations)], axis=-1)
+        facing = np.sum(heading * normal, axis=1)
+
+        touching = distance < radius
+        affected = touching.copy()
+        if self.mode == "repulsion":
+            close = (distance < self.avoidance_range) & (facing < 0)
+            weight = self.avoidance_strength * np.clip(1 - distance / self.avoidance_range, 0, 1)
+            heading = np.where(close[:, None], heading + weight[:, None] * normal, heading)
+            affected |= close
+
+        # agents not affected by obstacles keep their exact state (no rounding errors through heading vectors)
+        positions = positions.copy()
+        orientations = orientations.copy()
+        if not affected.any():
+            return positions, orientations
+
+        # pushing out of the obstacle and reflecting the heading from the surface
+        positions[touching] = centers[touching] + (radius - distance[touching])[:, None] * normal[touching] - radius
+        reflect = touching & (facing < 0)
+        heading = np.where(reflect[:, None], heading - 2 * facing[:, None] * normal, heading)
+        orientations[affected] = np.arctan2(-heading[affected, 1], heading[affected, 0]) % (2 * np.pi)
+        return positions, orientations
+
+    def draw(self, screen, color=(0, 0, 0)):
+        """Drawing the surfaces of obstacles (zero level of the distance field) onto a pygame surface"""
+        import pygame
+        if self.sdf is None:
+            self.compute()
+        if self._surface is None:
+            edge = (self.sdf <= 0) & (self.sdf > -self.resolution)
+            rgb = np.zeros(self.shape + (3,), dtype=np.uint8)
+            rgb[edge] = color
+            rgb[~edge] = (255, 255, 255)
+            surface = pygame.surfarray.make_surface(rgb.transpose(1, 0, 2))
+            surface.set_colorkey((255, 255, 255))
+            if self.resolution != 1:
+                surface = pygame.transform.scale(surface, (int(self.shape[1] * self.resolution),
+                                                           int(self.shape[0] * self.resolution)))
+            self._surface = surface
+        screen.blit(self._surface, (0, 0))
@@ -0,0 +1,425 @@
+"""
+regression.py : golden-trajectory equivalence and performance-regression harness. Reference trajectories of small
+            seeded scenarios are generated with the original per-agent implementation (Agent.update_forces through
+            Simulation) and saved to disk. Any engine (vectorized Simulation, Swarm, DistributedSwarm, ...) is then
+            run from the same seed and compared against them within the tolerances of the scenario on positions,
+            orientations and order parameters, and its speed is checked against minimal steps/sec thresholds.
+
+The golden trajectories of the repository are stored in data/golden and checked by tests/test_regression.py. They only
+have to be regenerated if the model itself is changed on purpose or a scenario is added or modified.
+
+Usage from the command line:
+    python -m pygmodw22.regression check --engines vectorized swarm distributed
+    python -m pygmodw22.regression benchmark --save-baseline baseline.json
+    python -m pygmodw22.regression benchmark --baseline baseline.json --max-slowdown 0.25
+    python -m pygmodw22.regression generate
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from pygmodw22 import kernels, support
+
+# golden trajectories shipped with the repository
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "data", "golden")
+
+# Reference scenarios. width and height are the real arena size (without padding). Tolerances are absolute: positions
+# in pixels, orientations in radians. The dynamics is chaotic, rounding differences of reordered floating point
+# operations (~1e-13) grow by about an order of magnitude every 10 steps, so trajectories are only compared over a
+# short horizon T where a correct engine stays far below the tolerances. The speed thresholds (steps/sec per engine)
+# are about half of the slowest rates measured on a single core of the development machine, so that a slowdown by a
+# factor of 2 or more fails. For tighter checks on a given machine save a baseline (see speed_failures).
+SCENARIOS = {
+    "metric_infinite": {
+        "N": 10, "T": 60, "width": 500, "height": 500, "boundary": "infinite", "agent_params": {},
+        "tolerance": {"position": 1e-5, "orientation": 1e-5, "order": 1e-6},
+        "min_steps_per_sec": {"agent": 100, "vectorized": 700, "swarm": 1100},
+    },
+    "metric_bounce_back": {
+        "N": 10, "T": 60, "width": 500, "height": 500, "boundary": "bounce_back", "agent_params": {},
+        "tolerance": {"position": 1e-5, "orientation": 1e-5, "order": 1e-6},
+        "min_steps_per_sec": {"agent": 130, "vectorized": 700, "swarm": 950},
+    },
+    "noise_free_infinite": {
+        "N": 20, "T": 60, "width": 500, "height": 500, "boundary": "infinite", "agent_params": {"noise_sig": 0},
+        "tolerance": {"position": 1e-5, "orientation": 1e-5, "order": 1e-6},
+        "min_steps_per_sec": {"agent": 25, "vectorized": 450, "swarm": 1100, "distributed": 250},
+    },
+    "limited_perception": {
+        "N": 15, "T": 60, "width": 500, "height": 500, "boundary": "infinite",
+        "agent_params": {"blind_angle": np.pi / 2, "k_neighbours": 5},
+        "tolerance": {"position": 1e-5, "orientation": 1e-5, "order": 1e-6},
+        "min_steps_per_sec": {"agent": 65, "vectorized": 450, "swarm": 800},
+    },
+    "leaders_followers": {
+        "N": 12, "T": 60, "width": 500, "height": 500, "boundary": "infinite", "agent_params": {},
+        "agent_types": {
+            "types": {"follower": {}, "leader": {"s_att": 0, "noise_sig": 0.05, "v_max": 1.5}},
+            "interactions": {"follower,leader": {"s_att": 0.1, "r_att": 300}},
+        },
+        "types": {"follower": 10, "leader": 2},
+        "tolerance": {"position": 1e-5, "orientation": 1e-5, "order": 1e-6},
+        "min_steps_per_sec": {"agent": 70, "vectorized": 600, "swarm": 1200},
+    },
+}
+
+# Performance scenarios of realistic swarm sizes with the interaction cutoff (cell search) of kernels.social_forces.
+# There is no golden trajectory for them (the per-agent reference is too slow), only speed is checked.
+PERF_SCENARIOS = {
+    "large_infinite_cutoff": {
+        "N": 1000, "T": 20, "width": 2000, "height": 2000, "boundary": "infinite", "agent_params": {"noise_sig": 0},
+        "cutoff": True,
+        "min_steps_per_sec": {"swarm": 14, "distributed": 12},
+    },
+    "large_bounce_back_cutoff": {
+        "N": 1000, "T": 20, "width": 2000, "height": 2000, "boundary": "bounce_back", "agent_params": {"noise_sig": 0},
+        "cutoff": True,
+        "min_steps_per_sec": {"swarm": 28, "distributed": 24},
+    },
+}
+
+# Fields of a scenario that define the model and so the golden trajectory (tolerances and speed thresholds can be
+# changed without regenerating it)
+MODEL_FIELDS = ("N", "T", "width", "height", "boundary", "agent_params", "agent_types", "types", "cutoff")
+
+
+def _model(scenario):
+    """Fields of a scenario that define the golden trajectory in their JSON representation"""
+    return json.loads(json.dumps({key: scenario.get(key) for key in MODEL_FIELDS}, default=float))
+
+
+def _agent_types(scenario):
+    """Parameter table of agent types of a scenario (None for homogeneous populations). agent_params of the scenario
+    are the defaults of all types."""
+    if "agent_types" not in scenario:
+        return None
+    from pygmodw22.agent_types import AgentTypes
+    spec = scenario["agent_types"]
+    interactions = {tuple(pair.split(",")): params for pair, params in spec.get("interactions", {}).items()}
+    return AgentTypes(spec["types"], interactions, defaults=scenario["agent_params"])
+
+
+class SimulationEngine:
+    """Per-agent pygame Simulation as an engine (reference implementation)"""
+    vectorized = False
+
+    @staticmethod
+    def supports(scenario):
+        """Checking if the engine can run a scenario (and reproduce its reference trajectory)"""
+        # Simulation has no interaction cutoff
+        return not scenario.get("cutoff", False)
+
+    def __init__(self, scenario, seed):
+        # no window is needed to step the simulation
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        from pygmodw22.sims import Simulation
+        np.random.seed(seed)
+        agent_types = _agent_types(scenario)
+        self.sim = Simulation(N=scenario["N"], T=scenario["T"], width=scenario["width"], height=scenario["height"],
+                              with_visualization=False, vectorized=self.vectorized, agent_types=agent_types,
+                              types=scenario.get("types"))
+        for agent in self.sim.agents:
+            agent.boundary = scenario["boundary"]
+            if agent_types is None:
+                for param, value in scenario["agent_params"].items():
+                    setattr(agent, param, value)
+
+    def step(self):
+        self.sim.step()
+
+    def get_state(self):
+        return self.sim.get_state()
+
+    def close(self):
+        import pygame
+        self.sim.close()
+        pygame.quit()
+
+
+class VectorizedSimulationEngine(SimulationEngine):
+    """Simulation with vectorized social forces as an engine"""
+    vectorized = True
+
+
+class SwarmEngine:
+    """Headless Swarm as an engine"""
+
+    @staticmethod
+    def supports(scenario):
+        return True
+
+    def __init__(self, scenario, seed):
+        from pygmodw22.swarm import Swarm
+        agent_types = _agent_types(scenario)
+        # agent parameters are part of the parameter table in heterogeneous populations
+        self.swarm = Swarm(N=scenario["N"], T=scenario["T"], width=scenario["width"], height=scenario["height"],
+                           boundary=scenario["boundary"],
+                           agent_params=None if agent_types is not None else scenario["agent_params"], seed=seed,
+                           agent_types=agent_types, types=scenario.get("types"))
+        if scenario.get("cutoff", False):
+            self.swarm.cutoff = kernels.interaction_cutoff(**self.swarm.params)
+
+    def step(self):
+        self.swarm.step()
+
+    def get_state(self):
+        return self.swarm.get_state()
+
+    def close(self):
+        self.swarm.close()
+
+
+class DistributedEngine:
+    """DistributedSwarm as an engine, started from the initial conditions of the reference. Its noise comes from
+    per-worker random generators, so only noise free scenarios can be compared."""
+
+    @staticmethod
+    def supports(scenario):
+        """Only homogeneous, noise free scenarios can be reproduced"""
+        return "agent_types" not in scenario and scenario["agent_params"].get("noise_sig", 0.1) == 0
+
+    def __init__(self, scenario, seed, n_workers=2):
+        from pygmodw22.distributed import DistributedSwarm
+        self.swarm = DistributedSwarm(N=scenario["N"], width=scenario["width"], height=scenario["height"],
+                                      boundary=scenario["boundary"], n_workers=n_workers, seed=seed,
+                                      agent_params=scenario["agent_params"])
+        # same initial conditions as Simulation
+        self.swarm.set_state(*SwarmEngine(scenario, seed).get_state())
+
+    def step(self):
+        self.swarm.run(1)
+
+    def get_state(self):
+        return self.swarm.get_state()
+
+    def close(self):
+        self.swarm.close()
+
+
+ENGINES = {
+    "agent": SimulationEngine,
+    "vectorized": VectorizedSimulationEngine,
+    "swarm": SwarmEngine,
+    "distributed": DistributedEngine,
+}
+
+
+def run_engine(engine_name, scenario, seed):
+    """
+    Running an engine on a scenario and recording its trajectory
+
+    :return: dictionary of positions (T+1, N, 2), orientations and velocities (T+1, N) and steps_per_sec (from the
+        median duration of a timestep, so that single hiccups of the machine do not count)
+    """
+    engine = ENGINES[engine_name](scenario, seed)
+    try:
+        states = [engine.get_state()]
+        durations = []
+        for _ in range(scenario["T"]):
+            start = time.perf_counter()
+            engine.step()
+            durations.append(time.perf_counter() - start)
+            states.append(engine.get_state())
+    finally:
+        engine.close()
+    positions, orientations, velocities = (np.array(arrays) for arrays in zip(*states))
+    duration = np.median(durations)
+    return {"positions": positions, "orientations": orientations, "velocities": velocities,
+            "steps_per_sec": 1 / duration if duration > 0 else np.inf}
+
+
+def order_parameters(positions, orientations, scenario):
+    """Polarization and milling over time as (T, 2) array"""
+    box = (scenario["width"], scenario["height"]) if scenario["boundary"] == "infinite" else None
+    return np.array([[support.polarization(ori), support.milling(pos, ori, box=box)]
+                     for pos, ori in zip(positions, orientations)])
+
+
+def generate_reference(path=GOLDEN_PATH, scenarios=None, seed=0):
+    """
+    Generating golden trajectories with the per-agent reference implementation
+
+    :param path: directory to save the trajectories into (one .npz file per scenario)
+    :param scenarios: names of scenarios to generate, default is all
+    :param seed: random seed of initial conditions and noise
+    """
+    os.makedirs(path, exist_ok=True)
+    for name in scenarios or SCENARIOS:
+        scenario = SCENARIOS[name]
+        result = run_engine("agent", scenario, seed)
+        np.savez_compressed(os.path.join(path, f"{name}.npz"), seed=seed, scenario=json.dumps(scenario, default=float),
+                            positions=result["positions"], orientations=result["orientations"],
+                            velocities=result["velocities"])
+        print(f"{name}: generated {scenario['T']} steps ({result['steps_per_sec']:.1f} steps/sec)")
+
+
+def compare(reference, result, scenario):
+    """
+    Comparing a trajectory with the reference
+
+    :return: dictionary of maximal errors in positions, orientations and order parameters
+    """
+    if scenario["boundary"] == "infinite":
+        position_error = support.distance_infinite(reference["positions"], result["positions"],
+                                                   L=(scenario["width"], scenario["height"]))
+    else:
+        position_error = result["positions"] - reference["positions"]
+    orientation_error = np.angle(np.exp(1j * (result["orientations"] - reference["orientations"])))
+    order_error = (order_parameters(result["positions"], result["orientations"], scenario) -
+                   order_parameters(reference["positions"], reference["orientations"], scenario))
+    return {
+        "position": float(np.max(np.linalg.norm(position_error, axis=-1))),
+        "orientation": float(np.max(np.abs(orientation_error))),
+        "order": float(np.max(np.abs(order_error))),
+    }
+
+
+def speed_failures(engine_name, scenario_name, scenario, steps_per_sec, baseline=None, max_slowdown=0.25):
+    """
+    Checking the speed of an engine on a scenario
+
+    :param steps_per_sec: measured speed
+    :param baseline: optional dictionary of engine name -> scenario name -> steps/sec measured earlier on the same
+        machine (see save_baseline). If the scenario is in the baseline, it is used instead of the fixed threshold.
+    :param max_slowdown: allowed relative drop of the speed compared to the baseline
+    :return: list of failure messages (empty if the speed is fine)
+    """
+    reference = (baseline or {}).get(engine_name, {}).get(scenario_name)
+    if reference is not None:
+        if steps_per_sec < (1 - max_slowdown) * reference:
+            return [f"{steps_per_sec:.1f} steps/sec is {1 - steps_per_sec / reference:.0%} slower than baseline "
+                    f"{reference:.1f}"]
+        return []
+    min_rate = scenario["min_steps_per_sec"].get(engine_name)
+    if min_rate is not None and steps_per_sec < min_rate:
+        return [f"{steps_per_sec:.1f} steps/sec < {min_rate}"]
+    return []
+
+
+def save_baseline(path, results):
+    """Saving measured speeds of check or benchmark results as baseline (JSON) for later runs on the same machine"""
+    baseline = {}
+    for res in results:
+        if res["status"] != "skipped":
+            baseline.setdefault(res["engine"], {})[res["scenario"]] = res["steps_per_sec"]
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2)
+
+
+def load_baseline(path):
+    """Loading a speed baseline saved with save_baseline"""
+    with open(path) as f:
+        return json.load(f)
+
+
+def check(path=GOLDEN_PATH, engines=("vectorized", "swarm"), scenarios=None, check_speed=True, baseline=None,
+          max_slowdown=0.25):
+    """
+    Checking engines against the golden trajectories
+
+    :param path: directory of golden trajectories (see generate_reference)
+    :param engines: names of engines to check (see ENGINES)
+    :param scenarios: names of scenarios to check, default is all
+    :param check_speed: if True the speed of the engines is checked (see speed_failures)
+    :param baseline: optional speed baseline, see speed_failures
+    :param max_slowdown: allowed relative drop of the speed compared to the baseline
+    :return: list of result dictionaries with engine, scenario, status ("passed", "failed" or "skipped" if the engine
+        does not support the scenario), errors, steps_per_sec and failures
+    """
+    results = []
+    for name in scenarios or SCENARIOS:
+        scenario = SCENARIOS[name]
+        reference = np.load(os.path.join(path, f"{name}.npz"))
+        if _model(json.loads(str(reference["scenario"]))) != _model(scenario):
+            raise ValueError(f"Golden trajectory of '{name}' was generated for a different scenario, regenerate it")
+        for engine_name in engines:
+            if not ENGINES[engine_name].supports(scenario):
+                results.append({"engine": engine_name, "scenario": name, "status": "skipped", "failures": []})
+                continue
+            result = run_engine(engine_name, scenario, int(reference["seed"]))
+            errors = compare(reference, result, scenario)
+            failures = [f"{key} error {value:.3g} > {scenario['tolerance'][key]:.3g}"
+                        for key, value in errors.items() if value > scenario["tolerance"][key]]
+            if check_speed:
+                failures += speed_failures(engine_name, name, scenario, result["steps_per_sec"], baseline, max_slowdown)
+            results.append({"engine": engine_name, "scenario": name, "errors": errors,
+                            "steps_per_sec": result["steps_per_sec"], "status": "failed" if failures else "passed",
+                            "failures": failures})
+    return results
+
+
+def benchmark(engines=("swarm", "distributed"), scenarios=None, baseline=None, max_slowdown=0.25, seed=0):
+    """
+    Checking the speed of engines on the performance scenarios (without golden trajectories)
+
+    :param engines: names of engines to check (see ENGINES)
+    :param scenarios: names of performance scenarios to run, default is all
+    :param baseline: optional speed baseline, see speed_failures
+    :param max_slowdown: allowed relative drop of the speed compared to the baseline
+    :param seed: random seed of initial conditions
+    :return: list of result dictionaries as in check (without errors)
+    """
+    results = []
+    for name in scenarios or PERF_SCENARIOS:
+        scenario = PERF_SCENARIOS[name]
+        for engine_name in engines:
+            if not ENGINES[engine_name].supports(scenario):
+                results.append({"engine": engine_name, "scenario": name, "status": "skipped", "failures": []})
+                continue
+            result = run_engine(engine_name, scenario, seed)
+            failures = speed_failures(engine_name, name, scenario, result["steps_per_sec"], baseline, max_slowdown)
+            results.append({"engine": engine_name, "scenario": name, "steps_per_sec": result["steps_per_sec"],
+                            "status": "failed" if failures else "passed", "failures": failures})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Golden-trajectory equivalence and performance regression checks")
+    parser.add_argument("command", choices=["generate", "check", "benchmark"])
+    parser.add_argument("path", nargs="?", default=GOLDEN_PATH, help="directory of golden trajectories")
+    parser.add_argument("--scenarios", nargs="*", default=None, choices=list(SCENARIOS) + list(PERF_SCENARIOS))
+    parser.add_argument("--engines", nargs="*", default=None, choices=list(ENGINES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-speed", action="store_true", help="do not check the speed of engines")
+    parser.add_argument("--baseline", default=None, help="speed baseline (JSON) to compare with instead of the "
+                                                         "fixed thresholds")
+    parser.add_argument("--max-slowdown", type=float, default=0.25,
+                        help="allowed relative drop of the speed compared to the baseline")
+    parser.add_argument("--save-baseline", default=None, help="saving the measured speeds as baseline (JSON)")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        generate_reference(args.path, args.scenarios, args.seed)
+        return 0
+
+    scenarios = SCENARIOS if args.command == "check" else PERF_SCENARIOS
+    if args.scenarios is not None and any(name not in scenarios for name in args.scenarios):
+        parser.error(f"Scenarios of {args.command} are {list(scenarios)}")
+    baseline = load_baseline(args.baseline) if args.baseline is not None else None
+    if args.command == "check":
+        results = check(args.path, args.engines or ("vectorized", "swarm"), args.scenarios,
+                        check_speed=not args.no_speed, baseline=baseline, max_slowdown=args.max_slowdown)
+    else:
+        results = benchmark(args.engines or ("swarm", "distributed"), args.scenarios, baseline=baseline,
+                            max_slowdown=args.max_slowdown, seed=args.seed)
+    for res in results:
+        if res["status"] == "skipped":
+            print(f"SKIP {res['engine']:>12} {res['scenario']:<24} not supported by the engine")
+            continue
+        errors = "".join(f"{key}={value:.2e}, " for key, value in res.get("errors", {}).items())
+        status = "PASS" if res["status"] == "passed" else "FAIL"
+        print(f"{status} {res['engine']:>12} {res['scenario']:<24} {errors}{res['steps_per_sec']:.1f} steps/sec"
+              + (f" ({'; '.join(res['failures'])})" if res["failures"] else ""))
+    counts = {status: sum(res["status"] == status for res in results) for status in ("passed", "failed", "skipped")}
+    print(", ".join(f"{count} {status}" for status, count in counts.items()))
+    if args.save_baseline is not None:
+        save_baseline(args.save_baseline, results)
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+shared_state.py : publishing the state of a running simulation into shared memory so that other processes (e.g. a
+            jupyter notebook) can read positions, orientations and velocities as numpy views without copying or
+            pickling sprites.
+
+Layout of a shared state block (all little-endian, 8 byte aligned):
+    header:       int64[4]          -> [sequence counter, simulation step, N, reserved]
+    positions:    float64[N, 2]     -> agent positions (same convention as Agent.position)
+    orientations: float64[N]        -> agent orientations
+    velocities:   float64[N]        -> agent absolute velocities
+
+The sequence counter is a seqlock: the writer increments it to an odd value before writing and to an even value
+after writing. Readers retry until they saw the same even value before and after copying the arrays.
+"""
+import time
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+HEADER_LEN = 4
+HEADER_BYTES = HEADER_LEN * np.dtype(np.int64).itemsize
+SEQ, STEP, NUM_AGENTS = 0, 1, 2
+
+
+def block_size(N):
+    """Number of bytes needed for a shared state block of N agents"""
+    return HEADER_BYTES + 4 * N * np.dtype(np.float64).itemsize
+
+
+def _map_arrays(buf, N):
+    """Creating numpy views on a shared memory buffer according to the block layout"""
+    header = np.ndarray((HEADER_LEN,), dtype=np.int64, buffer=buf, offset=0)
+    offset = HEADER_BYTES
+    positions = np.ndarray((N, 2), dtype=np.float64, buffer=buf, offset=offset)
+    offset += positions.nbytes
+    orientations = np.ndarray((N,), dtype=np.float64, buffer=buf, offset=offset)
+    offset += orientations.nbytes
+    velocities = np.ndarray((N,), dtype=np.float64, buffer=buf, offset=offset)
+    return header, positions, orientations, velocities
+
+
+def _attach(name):
+    """Attaching to an existing shared memory block without letting the resource tracker of this process unlink it
+    when the process exits (the block is owned by the writer)."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # python < 3.13 has no track argument
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class SharedStateWriter:
+    """
+    Owner of a shared state block. The simulation publishes its state into the block after every timestep.
+    """
+
+    def __init__(self, N, name=None):
+        """
+        Creating a new shared state block
+
+        :param N: number of agents
+        :param name: name of the shared memory block. Other processes attach to the block by this name. If None a
+            random name is generated by the OS and can be read from the name attribute.
+        """
+        self.N = N
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=block_size(N))
+        self.name = self.shm.name
+        self.header, self.positions, self.orientations, self.velocities = _map_arrays(self.shm.buf, N)
+        self.header[:] = 0
+        self.header[NUM_AGENTS] = N
+
+    def publish(self, positions, orientations, velocities, step):
+        """
+        Writing a consistent snapshot of the simulation state into the shared block
+
+        :param positions: agent positions as array of shape (N, 2)
+        :param orientations: agent orientations as array of shape (N, )
+        :param velocities: agent absolute velocities as array of shape (N, )
+        :param step: current simulation timestep
+        """
+        # odd sequence number: write in progress
+        self.header[SEQ] += 1
+        self.positions[:] = positions
+        self.orientations[:] = orientations
+        self.velocities[:] = velocities
+        self.header[STEP] = step
+        # even sequence number: snapshot is consistent
+        self.header[SEQ] += 1
+
+    def close(self, unlink=True):
+        """Releasing the shared block. Readers that are already attached keep their mapping until they close."""
+        self.header = self.positions = self.orientations = self.velocities = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class SharedStateReader:
+    """
+    Read-only access to a shared state block published by a SharedStateWriter in another process. The positions,
+    orientations and velocities attributes are zero-copy numpy views on the shared memory and can change at any time.
+    Use snapshot to read a consistent state.
+    """
+
+    def __init__(self, name):
+        """
+        Attaching to an existing shared state block
+
+        :param name: name of the shared memory block (SharedStateWriter.name)
+        """
+        self.name = name
+        self.shm = _attach(name)
+        N = int(np.ndarray((HEADER_LEN,), dtype=np.int64, buffer=self.shm.buf)[NUM_AGENTS])
+        self.N = N
+        self.header, self.positions, self.orientations, self.velocities = _map_arrays(self.shm.buf, N)
+        for arr in (self.positions, self.orientations, self.velocities):
+            arr.flags.writeable = False
+
+    @property
+    def step(self):
+        """Simulation timestep of the last published snapshot"""
+        return int(self.header[STEP])
+
+    def snapshot(self, out=None, timeout=1.0):
+        """
+        Copying a consistent snapshot of the shared state using the seqlock in the header
+
+        :param out: optional tuple of preallocated (positions, orientations, velocities) arrays to copy into
+        :param timeout: maximum time in seconds to wait for a consistent state
+        :return: step, positions, orientations, velocities
+        """
+        if out is None:
+            out = (np.empty_like(self.positions), np.empty_like(self.orientations), np.empty_like(self.velocities))
+        positions, orientations, velocities = out
+        deadline = time.monotonic() + timeout
+        while True:
+            seq_before = int(self.header[SEQ])
+            if seq_before % 2 == 0:
+                positions[:] = self.positions
+                orientations[:] = self.orientations
+                velocities[:] = self.velocities
+                step = int(self.header[STEP])
+                if int(self.header[SEQ]) == seq_before:
+                    return step, positions, orientations, velocities
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Could not read a consistent snapshot from shared state '{self.name}'")
+
+    def close(self):
+        """Detaching from the shared block"""
+        self.header = self.positions = self.orientations = self.velocities = None
+        self.shm.close()
@@ -2,8 +2,9 @@ import pygame
 import numpy as np
 import sys
 
-from pygmodw22 import support
+from pygmodw22 import support, kernels
 from pygmodw22.agent import Agent
+from pygmodw22.shared_state import SharedStateWriter
 
 from math import atan2
 import os
@@ -14,7 +15,8 @@ root_abm_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(
 
 class Simulation:
     def __init__(self, N=10, T=1000, width=500, height=500, framerate=25, window_pad=30, with_visualization=True,
-                 agent_radius=10, physical_obstacle_avoidance=False):
+                 agent_radius=10, physical_obstacle_avoidance=False, shared_state_name=None,
+                 convergence_monitor=None, obstacle_map=None, vectorized=False, agent_types=None, types=None):
         """
         Initializing the main simulation instance
         :param N: number of agents
@@ -27,6 +29,16 @@ class Simulation:
             that we can use a higher/maximal framerate.
         :param agent_radius: radius of the agents
         :param physical_obstacle_avoidance: obstacle avoidance based on pygame sprite collision groups
+        :param shared_state_name: if not None, the state of the agents is published in every timestep into a shared
+            memory block with this name so that other processes can read it (see shared_state.SharedStateReader)
+        :param convergence_monitor: optional convergence.ConvergenceMonitor instance. If given, the simulation is
+            stopped before T as soon as the order parameters are stationary and the time is saved in t_converged.
+        :param obstacle_map: optional obstacles.ObstacleMap with static obstacles. If it includes the walls of the
+            arena, the walls are not handled by the agents anymore but by the obstacle map.
+        :param vectorized: if True, social forces of all agents are calculated at once with the vectorized kernels
+            (kernels.social_forces) instead of calling Agent.update_forces for every agent.
+        :param agent_types: optional agent_types.AgentTypes parameter table for heterogeneous populations
+        :param types: types of the created agents, see create_agents
         """
         # Arena parameters
         self.change_agent_colors = False
@@ -44,9 +56,18 @@ class Simulation:
         self.is_paused = False
         self.show_zones = False
         self.physical_collision_avoidance = physical_obstacle_avoidance
+        self.convergence_monitor = convergence_monitor
+        self.t_converged = None
+        self.obstacle_map = obstacle_map
+        if obstacle_map is not None and (obstacle_map.WIDTH, obstacle_map.HEIGHT, obstacle_map.window_pad) != (
+                width, height, window_pad):
+            raise ValueError("Arena size and padding of the obstacle map do not match the simulation")
+        self.vectorized = vectorized
 
         # Agent parameters
         self.agent_radii = agent_radius
+        self.agent_types = agent_types
+        self.types = types
 
         # Initializing pygame
         pygame.init()
@@ -55,11 +76,23 @@ class Simulation:
         self.agents = pygame.sprite.Group()
         # Creating N agents in the environment
         self.create_agents()
+
+        # Shared memory export of agent states
+        self.shared_state = None
+        if shared_state_name is not None:
+            self.shared_state = SharedStateWriter(self.N, name=shared_state_name)
+            self.publish_state()
+
         self.screen = pygame.display.set_mode([self.WIDTH + 2 * self.window_pad, self.HEIGHT + 2 * self.window_pad])
         self.clock = pygame.time.Clock()
 
     def draw_walls(self):
-        """Drawing walls on the arena according to initialization, i.e. width, height and padding"""
+        """Drawing walls on the arena according to initialization, i.e. width, height and padding. If an obstacle map
+        is used, the surfaces of its distance field are drawn instead (including the walls if they are part of it)."""
+        if self.obstacle_map is not None:
+            self.obstacle_map.draw(self.screen, support.BLACK)
+            if self.obstacle_map.with_walls:
+                return
         pygame.draw.line(self.screen, support.BLACK,
                          [self.window_pad, self.window_pad],
                          [self.window_pad, self.window_pad + self.HEIGHT])
@@ -133,7 +166,7 @@ class Simulation:
                 else:
                     agent2.velocity = agent2.v_max
 
-    def add_new_agent(self, id, x, y, orient):
+    def add_new_agent(self, id, x, y, orient, type_id=0):
         """Adding a single new agent into agent sprites"""
         agent = Agent(
             id=id,
@@ -141,13 +174,31 @@ class Simulation:
             position=(x, y),
             orientation=orient,
             env_size=(self.WIDTH, self.HEIGHT),
-            color=support.BLUE,
+            color=support.TYPE_COLORS[type_id % len(support.TYPE_COLORS)],
             window_pad=self.window_pad
         )
+        if self.agent_types is not None:
+            # parameters of the agent according to its type
+            agent.agent_types = self.agent_types
+            agent.type_id = type_id
+            for param, value in self.agent_types.params[type_id].items():
+                setattr(agent, param, value)
+        if self.obstacle_map is not None and self.obstacle_map.with_walls:
+            # walls are part of the obstacle map
+            agent.boundary = "obstacles"
         self.agents.add(agent)
 
-    def create_agents(self):
-        """Creating agents according to how the simulation class was initialized"""
+    def create_agents(self, types=None):
+        """Creating agents according to how the simulation class was initialized
+        :param types: types of agents in heterogeneous populations (requires agent_types), either a list of N type
+            names or a dictionary of type name -> number of agents. Default is the types given at initialization."""
+        types = types if types is not None else self.types
+        if self.agent_types is not None:
+            type_ids = self.agent_types.type_ids(types, self.N)
+        elif types is not None:
+            raise ValueError("Agent types can only be assigned if agent_types parameter table is given")
+        else:
+            type_ids = np.zeros(self.N, dtype=np.int64)
         for i in range(self.N):
             # allowing agents to overlap arena borders (maximum overlap is radius of patch)
             x = np.random.randint(self.window_pad - self.agent_radii, self.WIDTH + self.window_pad - self.agent_radii)
@@ -156,7 +207,58 @@ class Simulation:
             # generating agent orientations
             orient = np.random.uniform(0, 2 * np.pi)
 
-            self.add_new_agent(i, x, y, orient)
+            self.add_new_agent(i, x, y, orient, type_ids[i])
+
+    def get_state(self):
+        """Collecting the state of all agents into arrays
+        :return: positions as (N, 2), orientations as (N, ) and velocities as (N, ) arrays"""
+        agents = list(self.agents)
+        positions = np.array([ag.position for ag in agents], dtype=np.float64).reshape(-1, 2)
+        orientations = np.array([ag.orientation for ag in agents], dtype=np.float64)
+        velocities = np.array([ag.velocity for ag in agents], dtype=np.float64)
+        return positions, orientations, velocities
+
+    def publish_state(self):
+        """Writing the current state of the agents into the shared memory block"""
+        positions, orientations, velocities = self.get_state()
+        self.shared_state.publish(positions, orientations, velocities, self.t)
+
+    def update_forces_vectorized(self):
+        """Updating overall social forces on all agents at once with the vectorized kernels. The model is the same as in
+        Agent.update_forces, perception parameters (blind_angle, k_neighbours) can differ between agents."""
+        agents = list(self.agents)
+        if len(agents) == 0:
+            return
+        positions, orientations, velocities = self.get_state()
+        params = {name: getattr(agents[0], name) for name in kernels.AGENT_PARAMS}
+        for name in ("noise_sig", "v_max", "blind_angle"):
+            params[name] = np.array([getattr(ag, name) for ag in agents])
+        if self.agent_types is not None:
+            # interaction parameters indexed by (type_i, type_j) in the kernel
+            params.update(self.agent_types.pair_params)
+            params["types"] = np.array([ag.type_id for ag in agents])
+        if any(ag.k_neighbours is not None for ag in agents):
+            params["k_neighbours"] = np.array([ag.k_neighbours if ag.k_neighbours is not None else len(agents)
+                                               for ag in agents])
+        radii = np.array([ag.radius for ag in agents], dtype=np.float64)
+        dtheta, dv = kernels.social_forces(positions + radii[:, None], orientations, velocities,
+                                           ids=np.array([ag.id for ag in agents]), boundary=agents[0].boundary,
+                                           box=(self.WIDTH, self.HEIGHT), **params)
+        dtheta += kernels.directional_noise(len(agents), **params)
+        for ag, ag_dtheta, ag_dv in zip(agents, dtheta, dv):
+            ag.dtheta = ag_dtheta
+            ag.dv = ag_dv
+
+    def avoid_obstacles(self):
+        """Applying obstacle avoidance of the obstacle map on all agents and updating the moved agents"""
+        positions, orientations, _ = self.get_state()
+        new_positions, new_orientations = self.obstacle_map.apply(positions, orientations, self.agent_radii)
+        changed = np.any(new_positions != positions, axis=1) | (new_orientations != orientations)
+        for ag, pos, ori, is_changed in zip(self.agents, new_positions, new_orientations, changed):
+            if is_changed and not ag.is_moved_with_cursor:
+                ag.position[:] = pos
+                ag.orientation = ori
+                ag.draw_update()
 
     def interact_with_event(self, events):
         """Carry out functionality according to user's interaction"""
@@ -179,6 +281,7 @@ class Simulation:
             # Exit if requested
             if event.type == pygame.QUIT:
                 print('Bye bye!')
+                self.close()
                 pygame.quit()
                 sys.exit()
 
@@ -258,11 +361,54 @@ class Simulation:
                 pygame.draw.circle(image, support.YELLOW, (cx, cy), r, width=3)
             self.screen.blit(image, (0, 0))
 
+    def step(self):
+        """Updating forces and states of all agents for a single timestep (without handling user interaction and
+        visualization)"""
+        if self.physical_collision_avoidance:
+            # ------ AGENT-AGENT INTERACTION ------
+            # Check if any 2 agents has been collided and reflect them from each other if so
+            collision_group_aa = pygame.sprite.groupcollide(
+                self.agents,
+                self.agents,
+                False,
+                False,
+                within_group_collision
+            )
+            collided_agents = []
+            # Carry out agent-agent collisions and collecting collided agents for later (according to parameters
+            # such as ghost mode, or teleportation)
+            for agent1, agent2 in collision_group_aa.items():
+                self.agent_agent_collision(agent1, agent2)
+
+        # Updating force on all agents
+        if self.vectorized:
+            self.update_forces_vectorized()
+        else:
+            for agent in self.agents:
+                agent.update_forces(self.agents)
+
+        # Update agents according to current visible obstacles
+        self.agents.update(self.agents)
+
+        # Avoiding static obstacles for all agents at once
+        if self.obstacle_map is not None:
+            self.avoid_obstacles()
+
+        # move to next simulation timestep
+        self.t += 1
+
+        if self.shared_state is not None:
+            self.publish_state()
+
     def start(self):
 
         start_time = datetime.now()
         print(f"Running simulation start method!")
 
+        if self.convergence_monitor is not None:
+            # the same monitor can be passed to multiple runs (e.g. in parameter sweeps)
+            self.convergence_monitor.reset()
+
         print("Starting main simulation loop!")
         # Main Simulation loop until dedicated simulation time
         while self.t < self.T:
@@ -273,31 +419,16 @@ class Simulation:
 
             if not self.is_paused:
 
-                if self.physical_collision_avoidance:
-                    # ------ AGENT-AGENT INTERACTION ------
-                    # Check if any 2 agents has been collided and reflect them from each other if so
-                    collision_group_aa = pygame.sprite.groupcollide(
-                        self.agents,
-                        self.agents,
-                        False,
-                        False,
-                        within_group_collision
-                    )
-                    collided_agents = []
-                    # Carry out agent-agent collisions and collecting collided agents for later (according to parameters
-                    # such as ghost mode, or teleportation)
-                    for agent1, agent2 in collision_group_aa.items():
-                        self.agent_agent_collision(agent1, agent2)
-
-                # Updating force on all agents
-                for agent in self.agents:
-                    agent.update_forces(self.agents)
-
-                # Update agents according to current visible obstacles
-                self.agents.update(self.agents)
-
-                # move to next simulation timestep
-                self.t += 1
+                self.step()
+
+                # Early termination in steady state
+                if self.convergence_monitor is not None and self.convergence_monitor.update(
+                        self.t, *self.get_state(), box=(self.WIDTH, self.HEIGHT),
+                        boundary=next(iter(self.agents)).boundary if len(self.agents) > 0 else "infinite"):
+                    self.t_converged = self.convergence_monitor.t_converged
+                    if self.t_converged is not None:
+                        print(f"Steady state detected at t={self.t_converged}")
+                    break
 
             # Draw environment and agents
             if self.with_visualization:
@@ -314,8 +445,22 @@ class Simulation:
         print(f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S.%f')} Total simulation time: ",
               (end_time - start_time).total_seconds())
 
+        self.close()
         pygame.quit()
 
+    def close(self):
+        """Releasing the shared memory block of the agent states (if any). Called at the end of start, call it
+        explicitly (or use the simulation as a context manager) when the simulation is driven through step."""
+        if self.shared_state is not None:
+            self.shared_state.close()
+            self.shared_state = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
 
 def within_group_collision(sprite1, sprite2):
     """Custom colllision check that omits collisions of sprite with itself. This way we can use group collision
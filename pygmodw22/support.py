@@ -2,8 +2,6 @@
 calc.py : Supplementary methods and calculations necessary for agents
 """
 import numpy as np
-import matplotlib.cm
-from scipy import integrate
 
 ### Supplementary Parameters ###
 BLACK = (0, 0, 0)
@@ -18,6 +16,8 @@ YELLOW = (190, 175, 50)
 RED = (255, 0, 0)
 LIGHT_RED = (255, 180, 180)
 BACKGROUND = WHITE
+# Colors of agent types in heterogeneous populations
+TYPE_COLORS = [BLUE, RED, GREEN, PURPLE, YELLOW]
 
 
 ### Supplementary Methods ###
@@ -83,20 +83,25 @@ def distance(agent1, agent2):
 def distance_infinite(p1, p2, L=500, dim=2):
     """ Returns the distance vector of two position vectors x,y
         by tanking periodic boundary conditions into account.
+        p1 and p2 can also be arrays of position vectors with the last axis as coordinates, e.g. (N, 2), in this case
+        the distance vectors are calculated elementwise (with numpy broadcasting).
 
-        Input parameters: L - system size, dim - no. of dimension
+        Input parameters: L - system size as a single number or per dimension e.g. (width, height),
+                          dim - no. of dimension
     """
-    distvec = p2 - p1
-    distvec_periodic = np.copy(distvec)
-    distvec_periodic[distvec < -0.5*L] += L
-    distvec_periodic[distvec > 0.5*L] -= L
+    L = np.asarray(L, dtype=np.float64)
+    distvec = np.asarray(p2) - np.asarray(p1)
+    distvec_periodic = np.where(distvec < -0.5*L, distvec + L, distvec)
+    distvec_periodic = np.where(distvec > 0.5*L, distvec_periodic - L, distvec_periodic)
     return distvec_periodic
 
 
 def calculate_color(orientation, velocity, max_velocity=1):
     """Calculates an RGB color from the colormap according to orientation and velocity. Color will be calculated from
     orientation while transparency from the absolute velocity compared to the max velocity."""
-    cmap = matplotlib.cm.get_cmap('Spectral')
+    # matplotlib is only loaded when colors are needed (visualization) to keep the import of the core fast
+    from matplotlib import colormaps
+    cmap = colormaps['Spectral']
     rgba = np.array(cmap(orientation / (2*np.pi)))
     # setting transparency according to vel
     rgba[3] = velocity/max_velocity
@@ -164,3 +169,40 @@ def CalcSingleRepForce(r_rep, steepness_rep, distvec):
     F_rep = SigThresh(dist, r_rep, steepness_rep)
     vec_rep = F_rep * distvec
     return vec_rep
+
+
+def polarization(orientations):
+    """Polarization order parameter of the group (length of the mean heading unit vector). 1 if all agents move in
+    the same direction and around 0 for disordered motion.
+
+    :param orientations: orientations of all agents as (N, ) array
+    """
+    orientations = np.asarray(orientations)
+    return np.hypot(np.mean(np.cos(orientations)), np.mean(np.sin(orientations)))
+
+
+def milling(positions, orientations, box=None):
+    """Milling (rotation) order parameter of the group (absolute mean angular momentum of heading unit vectors around
+    the center of mass). 1 if all agents circle around the center of mass in the same direction, around 0 otherwise.
+
+    :param positions: positions of all agents as (N, 2) array
+    :param orientations: orientations of all agents as (N, ) array
+    :param box: arena size as (width, height) for periodic boundary conditions. If given, the center of mass is the
+        circular mean per axis and relative positions are minimum image distance vectors, so that groups crossing the
+        borders of the arena are handled correctly. None means non-periodic arena.
+    """
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+    if box is None:
+        relpos = positions - np.mean(positions, axis=0)
+    else:
+        L = np.asarray(box, dtype=np.float64)
+        angles = 2 * np.pi * positions / L
+        center = L * np.arctan2(np.mean(np.sin(angles), axis=0), np.mean(np.cos(angles), axis=0)) / (2 * np.pi)
+        # minimum image distance vectors (positions can be more than one period away from the center)
+        relpos = (positions - center + 0.5 * L) % L - 0.5 * L
+    dist = np.linalg.norm(relpos, axis=1)
+    dist[dist == 0] = 1
+    # heading convention of the agents: y is growing downwards
+    hx = np.cos(orientations)
+    hy = -np.sin(orientations)
+    return np.abs(np.mean((relpos[:, 0] * hy - relpos[:, 1] * hx) / dist))
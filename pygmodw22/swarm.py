@@ -0,0 +1,158 @@
+"""
+swarm.py : headless version of the simulation. The state of all agents is stored in arrays and updated with the
+            vectorized kernels, so that batch runs and parameter sweeps do not need pygame or sprites. The model and
+            the initial conditions are the same as in sims.Simulation.
+"""
+import numpy as np
+
+from pygmodw22 import kernels
+from pygmodw22.shared_state import SharedStateWriter
+
+
+class Swarm:
+    def __init__(self, N=10, T=1000, width=500, height=500, window_pad=30, agent_radius=10, boundary="infinite",
+                 agent_params=None, cutoff=None, seed=None, shared_state_name=None, convergence_monitor=None,
+                 obstacle_map=None, agent_types=None, types=None):
+        """
+        Initializing a headless simulation
+        :param N: number of agents
+        :param T: simulation time
+        :param width: real width of environment (not window size)
+        :param height: real height of environment (not window size)
+        :param window_pad: padding of the environment in pixels (same coordinates as in Simulation)
+        :param agent_radius: radius of the agents
+        :param boundary: boundary condition, bounce_back or infinite
+        :param agent_params: dictionary to override default agent parameters (see kernels.AGENT_PARAMS)
+        :param cutoff: interaction cutoff distance, None means all pairs interact. Use kernels.interaction_cutoff()
+            for large swarms in large arenas.
+        :param seed: random seed of initial conditions and noise. If None the global numpy random state is used the
+            same way as in Simulation.
+        :param shared_state_name: if not None, the state of the agents is published in every timestep into a shared
+            memory block with this name (see shared_state.SharedStateReader)
+        :param convergence_monitor: optional convergence.ConvergenceMonitor instance. If given, start stops before T
+            as soon as the order parameters are stationary and the time is saved in t_converged.
+        :param obstacle_map: optional obstacles.ObstacleMap with static obstacles. If it includes the walls of the
+            arena, the boundary is set to "obstacles" and the walls are handled by the obstacle map.
+        :param agent_types: optional agent_types.AgentTypes parameter table for heterogeneous populations. It already
+            includes all agent parameters, so it can not be combined with agent_params (use the defaults of the table
+            instead).
+        :param types: types of the created agents, see create_agents
+        """
+        # Arena parameters
+        self.WIDTH = width
+        self.HEIGHT = height
+        self.window_pad = window_pad
+        self.boundaries_x = [self.window_pad, self.window_pad + self.WIDTH]
+        self.boundaries_y = [self.window_pad, self.window_pad + self.HEIGHT]
+        self.boundary = boundary
+
+        # Simulation parameters
+        self.N = N
+        self.T = T
+        self.t = 0
+        self.rng = np.random.RandomState(seed) if seed is not None else np.random
+        self.cutoff = cutoff
+        self.convergence_monitor = convergence_monitor
+        self.t_converged = None
+        self.obstacle_map = obstacle_map
+        if obstacle_map is not None:
+            if (obstacle_map.WIDTH, obstacle_map.HEIGHT, obstacle_map.window_pad) != (width, height, window_pad):
+                raise ValueError("Arena size and padding of the obstacle map do not match the simulation")
+            if obstacle_map.with_walls:
+                # walls are part of the obstacle map
+                self.boundary = "obstacles"
+
+        # Agent parameters
+        self.agent_radii = agent_radius
+        if agent_params and agent_types is not None:
+            raise ValueError("agent_params can not be combined with agent_types, use AgentTypes(defaults=...) instead")
+        self.params = dict(kernels.AGENT_PARAMS)
+        if agent_params is not None:
+            self.params.update(agent_params)
+        self.agent_types = agent_types
+
+        self.create_agents(types)
+
+        # Shared memory export of agent states
+        self.shared_state = None
+        if shared_state_name is not None:
+            self.shared_state = SharedStateWriter(self.N, name=shared_state_name)
+            self.publish_state()
+
+    def create_agents(self, types=None):
+        """Creating agents with the same random initial conditions as Simulation.create_agents
+        :param types: types of agents in heterogeneous populations (requires agent_types), either a list of N type
+            names or a dictionary of type name -> number of agents"""
+        if self.agent_types is not None:
+            self.type_ids = self.agent_types.type_ids(types, self.N)
+            self.params.update(self.agent_types.kernel_params(self.type_ids))
+        elif types is not None:
+            raise ValueError("Agent types can only be assigned if agent_types parameter table is given")
+        else:
+            self.type_ids = np.zeros(self.N, dtype=np.int64)
+        self.positions = np.zeros((self.N, 2))
+        self.orientations = np.zeros(self.N)
+        self.velocities = np.ones(self.N)
+        for i in range(self.N):
+            # allowing agents to overlap arena borders (maximum overlap is radius of patch)
+            self.positions[i, 0] = self.rng.randint(self.window_pad - self.agent_radii,
+                                                    self.WIDTH + self.window_pad - self.agent_radii)
+            self.positions[i, 1] = self.rng.randint(self.window_pad - self.agent_radii,
+                                                    self.HEIGHT + self.window_pad - self.agent_radii)
+            self.orientations[i] = self.rng.uniform(0, 2 * np.pi)
+
+    def get_state(self):
+        """Copying the state of all agents
+        :return: positions as (N, 2), orientations as (N, ) and velocities as (N, ) arrays"""
+        return self.positions.copy(), self.orientations.copy(), self.velocities.copy()
+
+    def publish_state(self):
+        """Writing the current state of the agents into the shared memory block"""
+        self.shared_state.publish(self.positions, self.orientations, self.velocities, self.t)
+
+    def step(self):
+        """Updating forces and states of all agents for a single timestep"""
+        dtheta, dv = kernels.social_forces(self.positions + self.agent_radii, self.orientations, self.velocities,
+                                           boundary=self.boundary, box=(self.WIDTH, self.HEIGHT), cutoff=self.cutoff,
+                                           **self.params)
+        dtheta += kernels.directional_noise(self.N, rng=self.rng, **self.params)
+        self.positions, self.orientations, self.velocities = kernels.integrate(
+            self.positions, self.orientations, self.velocities, dtheta, dv, self.agent_radii,
+            self.boundaries_x, self.boundaries_y, self.boundary, **self.params)
+        if self.obstacle_map is not None:
+            self.positions, self.orientations = self.obstacle_map.apply(self.positions, self.orientations,
+                                                                        self.agent_radii)
+        self.t += 1
+
+        if self.shared_state is not None:
+            self.publish_state()
+
+    def start(self):
+        """Running the simulation until the dedicated simulation time"""
+        if self.convergence_monitor is not None:
+            # the same monitor can be passed to multiple runs (e.g. in parameter sweeps)
+            self.convergence_monitor.reset()
+        while self.t < self.T:
+            self.step()
+
+            # Early termination in steady state
+            if self.convergence_monitor is not None and self.convergence_monitor.update(
+                    self.t, self.positions, self.orientations, self.velocities, box=(self.WIDTH, self.HEIGHT),
+                    boundary=self.boundary):
+                self.t_converged = self.convergence_monitor.t_converged
+                break
+
+        self.close()
+
+    def close(self):
+        """Releasing the shared memory block of the agent states (if any). Called at the end of start, call it
+        explicitly (or use the swarm as a context manager) when the simulation is driven through step."""
+        if self.shared_state is not None:
+            self.shared_state.close()
+            self.shared_state = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
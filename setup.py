@@ -11,14 +11,16 @@ setup(
     packages=find_packages(exclude=['tests']),
     package_data={'pygmodw22': ['*.txt']},
     python_requires=">=3.7",
+    # the core (Swarm, kernels, shared state, convergence) only needs numpy, everything else is optional
     install_requires=[
-        'pygame',
-        'numpy',
-        'scipy',
-        'matplotlib',
-        'opencv-python',
-        'zarr'
+        'numpy'
     ],
+    extras_require={
+        'rendering': ['pygame', 'matplotlib'],
+        'obstacles': ['scipy', 'opencv-python'],
+        'analysis': ['zarr'],
+        'all': ['pygame', 'matplotlib', 'scipy', 'opencv-python', 'zarr'],
+    },
     classifiers=[
         'Development Status :: 2 - Pre-Alpha',
         'Intended Audience :: Science/Research',
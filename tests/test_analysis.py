@@ -0,0 +1,69 @@
+"""
+test_analysis.py : out-of-core trajectory analysis on uniformly distributed agents
+"""
+import numpy as np
+import pytest
+
+from pygmodw22 import analysis
+
+BOX = (500, 500)
+
+
+@pytest.fixture(scope="module")
+def uniform_trajectory(tmp_path_factory):
+    """Random trajectory of agents uniformly distributed in the (periodic) arena, saved as .npy files"""
+    rng = np.random.default_rng(0)
+    T, N = 400, 30
+    positions = rng.uniform(30, 30 + BOX[0], (T, N, 2))
+    orientations = rng.uniform(0, 2 * np.pi, (T, N))
+    velocities = rng.uniform(0, 1, (T, N))
+    path = tmp_path_factory.mktemp("trajectory") / "run"
+    analysis.save_trajectory(path, positions, orientations, velocities)
+    return path, (positions, orientations, velocities)
+
+
+@pytest.fixture(scope="module")
+def zarr_trajectory(uniform_trajectory, tmp_path_factory):
+    """The same trajectory as a chunked zarr group"""
+    zarr = pytest.importorskip("zarr")
+    path = tmp_path_factory.mktemp("trajectory") / "run.zarr"
+    group = zarr.open_group(str(path), mode="w")
+    for name, array in zip(analysis.ARRAY_NAMES, uniform_trajectory[1]):
+        group.create_array(name, data=array, chunks=(64,) + array.shape[1:])
+    return path
+
+
+def test_pair_correlation_of_uniform_agents_is_one(uniform_trajectory):
+    r, g = analysis.pair_correlation(uniform_trajectory[0], r_max=200, n_bins=10, box=BOX, n_workers=1)
+    assert np.abs(np.mean(g) - 1) < 0.02
+    assert np.all(np.abs(g - 1) < 0.1)
+
+
+def test_mean_neighbour_number_of_uniform_agents(uniform_trajectory):
+    radius = 60
+    N = uniform_trajectory[1][0].shape[1]
+    stats = analysis.neighbour_statistics(uniform_trajectory[0], radius=radius, box=BOX, n_workers=1)
+    expected = (N - 1) * np.pi * radius ** 2 / (BOX[0] * BOX[1])
+    assert abs(stats["mean"] - expected) < 0.03 * expected
+    assert np.isclose(np.sum(stats["distribution"]), 1)
+
+
+@pytest.mark.parametrize("boundary", ["infinite", "bounce_back"])
+def test_stores_and_workers_give_identical_results(uniform_trajectory, zarr_trajectory, boundary):
+    results = []
+    for path in (uniform_trajectory[0], zarr_trajectory):
+        for n_workers in (1, 2):
+            r, g = analysis.pair_correlation(path, r_max=200, box=BOX, boundary=boundary, n_workers=n_workers,
+                                             chunk_frames=50)
+            stats = analysis.neighbour_statistics(path, radius=60, box=BOX, boundary=boundary, n_workers=n_workers,
+                                                  chunk_frames=50)
+            lags, vacf = analysis.velocity_autocorrelation(path, max_lag=20, n_workers=n_workers, chunk_frames=50)
+            results.append((g, stats["distribution"], vacf))
+    for result in results[1:]:
+        for value, reference in zip(result, results[0]):
+            np.testing.assert_allclose(value, reference, rtol=1e-12, atol=0)
+
+
+def test_velocity_autocorrelation_needs_more_frames_than_max_lag(uniform_trajectory):
+    with pytest.raises(ValueError):
+        analysis.velocity_autocorrelation(uniform_trajectory[0], max_lag=5, frames=(0, 3), n_workers=1)
@@ -0,0 +1,62 @@
+"""
+test_convergence.py : early termination of runs in steady state
+"""
+import numpy as np
+
+from pygmodw22 import support
+from pygmodw22.convergence import ConvergenceMonitor
+from pygmodw22.swarm import Swarm
+
+
+def _mill(center, radius=60, n=40):
+    """Positions and orientations of agents circling around center counter-clockwise"""
+    angles = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    positions = np.stack([center[0] + radius * np.cos(angles), center[1] - radius * np.sin(angles)], axis=1)
+    return positions, angles + np.pi / 2
+
+
+def test_stops_only_after_min_steps():
+    monitor = ConvergenceMonitor(window=10, min_steps=50)
+    positions, orientations = _mill((280, 280))
+    velocities = np.ones(len(positions))
+    stops = [monitor.update(t, positions, orientations, velocities) for t in range(1, 61)]
+    # stationary from t=20 on (two full windows), but not stopped before min_steps
+    assert not any(stops[:49])
+    assert stops[49]
+    assert monitor.t_converged == 50
+
+
+def test_max_steps_stops_without_convergence():
+    monitor = ConvergenceMonitor(window=10, tolerance=1e-12, min_steps=0, max_steps=30)
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(30, 530, (10, 2))
+    stops = [monitor.update(t, positions, rng.uniform(0, 2 * np.pi, 10), np.ones(10)) for t in range(1, 31)]
+    assert stops[-1] and not any(stops[:-1])
+    assert not monitor.converged
+    assert monitor.t_converged is None
+
+
+def test_monitor_is_reset_when_reused():
+    def run(monitor, seed):
+        swarm = Swarm(N=10, T=3000, seed=seed, convergence_monitor=monitor)
+        swarm.start()
+        return swarm.t_converged
+
+    monitor = ConvergenceMonitor()
+    reused = [run(monitor, seed) for seed in (1, 2)]
+    fresh = [run(ConvergenceMonitor(), seed) for seed in (1, 2)]
+    assert reused == fresh
+    assert all(t is not None and t >= monitor.min_steps for t in reused)
+
+
+def test_milling_across_periodic_border():
+    box = (500, 500)
+    for center in [(280, 280), (30, 280), (30, 30)]:
+        positions, orientations = _mill(center)
+        # wrapping into the arena as with infinite boundary condition
+        positions = (positions - 30) % box + 30
+        assert np.isclose(support.milling(positions, orientations, box=box), 1)
+
+        monitor = ConvergenceMonitor(order_parameters=("milling",))
+        monitor.update(1, positions, orientations, np.ones(len(positions)), box=box, boundary="infinite")
+        assert np.isclose(monitor.history["milling"][0], 1)
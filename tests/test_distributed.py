@@ -0,0 +1,33 @@
+"""
+test_distributed.py : domain decomposition of DistributedSwarm against the serial Swarm
+"""
+import numpy as np
+import pytest
+
+from pygmodw22.distributed import DistributedSwarm, strip_index
+from pygmodw22.swarm import Swarm
+
+
+@pytest.mark.parametrize("boundary", ["infinite", "bounce_back"])
+def test_partial_halos_match_serial_swarm(boundary):
+    # strips (400 px) are wider than the interaction cutoff (~278 px), so every worker only sees a part of the arena
+    params = {"noise_sig": 0}
+    swarm = Swarm(N=300, width=2000, height=1500, boundary=boundary, agent_params=params, seed=0)
+    with DistributedSwarm(N=300, width=2000, height=1500, n_workers=5, boundary=boundary, agent_params=params,
+                          seed=0) as distributed:
+        assert distributed.cutoff < 2000 / 5
+        swarm.cutoff = distributed.cutoff
+        distributed.set_state(*swarm.get_state())
+        owner_before = distributed.owner.copy()
+        for _ in range(20):
+            swarm.step()
+        distributed.run(20)
+        positions, orientations, velocities = distributed.get_state()
+        owner_after = distributed.owner.copy()
+
+    # agents migrated between strips during the run
+    np.testing.assert_array_equal(owner_after, strip_index(positions[:, 0] + 10, 5, 2000, 30))
+    assert np.any(owner_after != owner_before)
+    np.testing.assert_allclose(positions, swarm.positions, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(orientations, swarm.orientations, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(velocities, swarm.velocities, rtol=0, atol=1e-9)
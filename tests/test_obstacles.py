@@ -0,0 +1,64 @@
+"""
+test_obstacles.py : static obstacles with a precomputed signed distance field
+"""
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy")
+
+from pygmodw22.obstacles import ObstacleMap  # noqa: E402
+from pygmodw22.swarm import Swarm  # noqa: E402
+
+
+def _pillars(mode="reflect"):
+    """Walled arena with two pillars and a wall segment"""
+    obstacle_map = ObstacleMap(mode=mode)
+    obstacle_map.add_circle(180, 200, 40)
+    obstacle_map.add_circle(400, 380, 60)
+    obstacle_map.add_rectangle(250, 100, 20, 150)
+    return obstacle_map
+
+
+@pytest.mark.parametrize("mode", ["reflect", "repulsion"])
+def test_agents_away_from_obstacles_are_unchanged(mode):
+    obstacle_map = ObstacleMap(with_walls=False, mode=mode)
+    obstacle_map.add_circle(100, 100, 20)
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(250, 500, (200, 2))
+    orientations = rng.uniform(0, 2 * np.pi, 200)
+    new_positions, new_orientations = obstacle_map.apply(positions, orientations, 10)
+    # bit by bit, no rounding through heading vectors
+    np.testing.assert_array_equal(new_positions, positions)
+    np.testing.assert_array_equal(new_orientations, orientations)
+
+
+@pytest.mark.parametrize("mode", ["reflect", "repulsion"])
+def test_agent_centers_never_inside_obstacles(mode):
+    obstacle_map = _pillars(mode)
+    swarm = Swarm(N=50, T=500, seed=1, obstacle_map=obstacle_map)
+    for _ in range(swarm.T):
+        swarm.step()
+        distance, _ = obstacle_map.sample(swarm.positions + swarm.agent_radii)
+        assert np.all(distance > 0)
+
+
+def test_walls_switch_engines_to_obstacle_boundary():
+    swarm = Swarm(N=5, obstacle_map=ObstacleMap())
+    assert swarm.boundary == "obstacles"
+    assert Swarm(N=5, obstacle_map=ObstacleMap(with_walls=False)).boundary == "infinite"
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pytest.importorskip("pygame")
+    from pygmodw22.sims import Simulation
+    simulation = Simulation(N=5, with_visualization=False, obstacle_map=ObstacleMap())
+    try:
+        assert all(agent.boundary == "obstacles" for agent in simulation.agents)
+    finally:
+        simulation.close()
+
+
+def test_mismatching_arena_is_rejected():
+    with pytest.raises(ValueError):
+        Swarm(N=5, obstacle_map=ObstacleMap(width=600))
@@ -0,0 +1,14 @@
+"""
+test_regression.py : checking all engines against the golden trajectories in data/golden (see pygmodw22/regression.py)
+"""
+import pytest
+
+from pygmodw22 import regression
+
+
+@pytest.mark.parametrize("engine", list(regression.ENGINES))
+def test_engine_reproduces_golden_trajectories(engine):
+    # speed depends on the machine, it is checked with the command line interface only
+    results = regression.check(engines=(engine,), check_speed=False)
+    failures = [f"{res['scenario']}: {'; '.join(res['failures'])}" for res in results if res["status"] == "failed"]
+    assert not failures, "\n".join(failures)
@@ -0,0 +1,47 @@
+"""
+test_shared_state.py : publishing the simulation state into shared memory and reading it from another process
+"""
+import multiprocessing as mp
+
+import numpy as np
+import pytest
+
+from pygmodw22.shared_state import SharedStateReader, SharedStateWriter
+
+
+def _read_snapshot(name, queue):
+    """Attaching to the shared block by name in a separate process and sending back a snapshot"""
+    reader = SharedStateReader(name)
+    try:
+        queue.put(reader.snapshot())
+    finally:
+        reader.close()
+
+
+def test_reader_in_other_process_gets_published_state():
+    rng = np.random.default_rng(0)
+    positions, orientations, velocities = rng.uniform(0, 500, (20, 2)), rng.uniform(0, 6, 20), rng.uniform(0, 1, 20)
+    writer = SharedStateWriter(20)
+    try:
+        writer.publish(positions, orientations, velocities, step=42)
+        ctx = mp.get_context("spawn")
+        queue = ctx.Queue()
+        process = ctx.Process(target=_read_snapshot, args=(writer.name, queue))
+        process.start()
+        step, read_positions, read_orientations, read_velocities = queue.get(timeout=30)
+        process.join(timeout=30)
+    finally:
+        writer.close()
+    assert process.exitcode == 0
+    assert step == 42
+    np.testing.assert_array_equal(read_positions, positions)
+    np.testing.assert_array_equal(read_orientations, orientations)
+    np.testing.assert_array_equal(read_velocities, velocities)
+
+
+def test_block_is_released_after_close():
+    writer = SharedStateWriter(5)
+    name = writer.name
+    writer.close()
+    with pytest.raises(FileNotFoundError):
+        SharedStateReader(name)